@@ -31,15 +31,20 @@ import numpy as np
 import yaml
 import time
 import requests
-import hashlib
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import hmac
 import json
 import os
 import re
-from collections import deque
+import queue
+import threading
+import atexit
 from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass
 
+from utils.yaml_cache import load_yaml_cached
+
 def load_env_file(env_path: str = ".env"):
     """.envファイルを読み込んで環境変数に設定"""
     if not os.path.exists(env_path):
@@ -94,6 +99,10 @@ def expand_environment_variables(config: Dict) -> Dict:
     
     return expand_value(config)
 
+# ランプ状態の整数コード（履歴のリングバッファに格納する値）
+STATE_NAMES = ("UNKNOWN", "RED", "GREEN")
+STATE_CODES = {name: code for code, name in enumerate(STATE_NAMES)}
+
 @dataclass
 class LampStatus:
     """ランプ状態を表すデータクラス"""
@@ -116,15 +125,103 @@ class LampDetector:
         # 環境変数を展開
         self.config = expand_environment_variables(self.config)
         
-        self.lamp_history = {i: deque(maxlen=self.config["logic"]["frames_window"]) 
-                           for i in range(1, 13)}
+        # 判定履歴は全ランプ分をまとめた (12, 窓サイズ) の配列をリングバッファとして保持
+        # （行 = ランプID - 1、状態は状態コード、信頼度はfloat32）
+        self._frames_window = self.config["logic"]["frames_window"]
+        self._state_ring = np.zeros((12, self._frames_window), dtype=np.uint8)
+        self._conf_ring = np.zeros((12, self._frames_window), dtype=np.float32)
+        self._ring_pos = [0] * 12
+        self._ring_len = [0] * 12
+        # 窓内の状態ごとの件数と信頼度の合計（挿入・追い出し時に差分更新）
+        # 1要素ずつの更新はNumPyのスカラー演算より速いためPythonのリストで持つ
+        self._state_count = [[0] * len(STATE_NAMES) for _ in range(12)]
+        self._conf_sum = [[0.0] * len(STATE_NAMES) for _ in range(12)]
         self.lamp_statuses = {i: LampStatus(i, "UNKNOWN", 0.0) for i in range(1, 13)}
         
+        # 直前に解析したフレームと解析結果（同じ読み取り専用フレームの再解析を省略するため）
+        self._last_frame = None
+        self._last_results = []
+        
         # 設定値の取得
         self.logic_config = self.config["logic"]
         self.notify_config = self.config["notify"]
         self.rois = self.config["rois"]
         
+        # HMAC署名用の共通鍵はバイト列に変換して保持
+        self._secret = self.notify_config["secret"].encode('utf-8')
+        
+        # 判定ロジックの設定値をフレームごとに辞書参照しないよう事前に展開
+        self._min_brightness = self.logic_config["min_brightness_v"]
+        self._red_hue_ranges = [tuple(r) for r in self.logic_config["red_hue_range"]]
+        self._red_sat_min = self.logic_config["red_sat_min"]
+        self._red_val_min = self.logic_config["red_val_min"]
+        self._green_hue_min, self._green_hue_max = self.logic_config["green_hue_range"]
+        self._green_sat_min = self.logic_config["green_sat_min"]
+        self._green_val_min = self.logic_config["green_val_min"]
+        self._red_thresh = self.logic_config["red_ratio_thresh"]
+        self._green_thresh = self.logic_config["green_ratio_thresh"]
+        
+        # cv2.inRange用のHSV下限・上限（明度フィルタはV下限に含めて1パスで判定）
+        self._bright_lower = np.array([0, 0, self._min_brightness], dtype=np.uint8)
+        self._bright_upper = np.array([255, 255, 255], dtype=np.uint8)
+        red_val_floor = max(self._red_val_min, self._min_brightness)
+        self._red_bounds = [
+            (np.array([hue_min, self._red_sat_min, red_val_floor], dtype=np.uint8),
+             np.array([hue_max, 255, 255], dtype=np.uint8))
+            for hue_min, hue_max in self._red_hue_ranges
+        ]
+        green_val_floor = max(self._green_val_min, self._min_brightness)
+        self._green_lower = np.array([self._green_hue_min, self._green_sat_min, green_val_floor], dtype=np.uint8)
+        self._green_upper = np.array([self._green_hue_max, 255, 255], dtype=np.uint8)
+        
+        # 形態学的処理のカーネルは設定から一度だけ生成
+        kernel_size = self.logic_config["morphological_kernel"]
+        self._morph_kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
+        # この画素数未満の小さなROIでは形態学的処理を省略（ノイズ除去効果よりコストが勝るため）
+        self._morph_skip_px = self.logic_config.get("morphological_skip_px", 0)
+        
+        # 色判定前にROIを縮小する倍率（既定の1は縮小なし）
+        # オープニングのカーネルは縮小後の画像に掛かり元画像上では倍率分大きく効くため、
+        # 2以上にすると細い点灯領域が除去されて判定が変わることがある
+        self._downsample_factor = max(1, int(self.logic_config.get("roi_downsample_factor", 1)))
+        
+        # ROIを積み重ねた解析用画像のレイアウト（最初のフレームのサイズで作成）
+        self._stack_shape = None
+        
+        # 通知はフレーム処理から切り離し、キュー経由でワーカースレッドが送信
+        self._notify_queue = queue.Queue(maxsize=64)
+        self._notify_rate = 5.0              # 送信レート上限（件/秒、トークンバケット）
+        self._notify_batch_window = 0.5      # 同時発生した通知をまとめる待ち時間（秒）
+        self._notify_batch_max = 10          # 1回のPOSTにまとめる最大件数
+        self._notify_tokens = self._notify_rate
+        self._notify_token_time = time.monotonic()
+        
+        # 接続を使い回すセッション（接続失敗と429だけをRetry-Afterを尊重して自動再試行）
+        # POSTは冪等ではないため、読み取りタイムアウトや5xxでは再送しない（同じ通知が重複して届くため）
+        retry = Retry(
+            total=3,
+            connect=3,
+            read=0,
+            status=3,
+            backoff_factor=1,
+            status_forcelist=[429],
+            allowed_methods=frozenset({"POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=retry)
+        self._session = requests.Session()
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        
+        self._notify_thread = threading.Thread(target=self._notify_worker, daemon=True)
+        self._notify_thread.start()
+        
+        # 前回終了時のランプ状態と判定履歴を復元し、終了時に保存する（再起動時の慣らし期間を省略）
+        self._state_path = ".lamp_state.npz"
+        self.load_state()
+        atexit.register(self.save_state)
+        
         print("ランプ検出システムを初期化しました")
         print(f"フレーム窓サイズ: {self.logic_config['frames_window']}")
         print(f"通知間隔: {self.notify_config['min_interval_sec']}秒")
@@ -133,8 +230,7 @@ class LampDetector:
     def load_config(self, config_path: str) -> Dict:
         """設定ファイルを読み込み"""
         try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f)
+            return load_yaml_cached(config_path)
         except FileNotFoundError:
             print(f"設定ファイル {config_path} が見つかりません")
             raise
@@ -142,111 +238,210 @@ class LampDetector:
             print(f"設定ファイルの読み込みエラー: {e}")
             raise
     
-    def extract_roi(self, frame: np.ndarray, lamp_id: int) -> Optional[np.ndarray]:
-        """ROI領域を抽出"""
-        roi_key = f"lamp_{lamp_id}"
-        if roi_key not in self.rois:
-            return None
-        
-        x, y, w, h = self.rois[roi_key]
-        if x < 0 or y < 0 or x + w > frame.shape[1] or y + h > frame.shape[0]:
-            return None
-        
-        return frame[y:y+h, x:x+w]
+    def save_state(self):
+        """ランプ状態と判定履歴をバイナリファイルに保存"""
+        try:
+            statuses = [self.lamp_statuses[i] for i in range(1, 13)]
+            tmp_path = self._state_path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    state_ring=self._state_ring,
+                    conf_ring=self._conf_ring,
+                    ring_pos=np.array(self._ring_pos, dtype=np.int32),
+                    ring_len=np.array(self._ring_len, dtype=np.int32),
+                    status_codes=np.array([STATE_CODES[st.state] for st in statuses], dtype=np.uint8),
+                    confidences=np.array([st.confidence for st in statuses], dtype=np.float64),
+                    last_notifications=np.array([st.last_notification for st in statuses], dtype=np.float64),
+                )
+            os.replace(tmp_path, self._state_path)
+        except Exception as e:
+            print(f"ランプ状態の保存エラー: {e}")
     
-    def analyze_color(self, roi: np.ndarray) -> Tuple[str, float]:
-        """ROI内の色を分析してランプ状態を判定"""
-        if roi is None or roi.size == 0:
-            return "UNKNOWN", 0.0
-        
-        # HSVに変換
-        hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
-        
-        # 明度フィルタ
-        min_brightness = self.logic_config["min_brightness_v"]
-        bright_mask = hsv[:, :, 2] >= min_brightness
+    def load_state(self):
+        """保存済みのランプ状態と判定履歴を復元（窓サイズが変わっていれば破棄）"""
+        if not os.path.exists(self._state_path):
+            return
         
-        if not np.any(bright_mask):
-            return "UNKNOWN", 0.0
+        try:
+            with np.load(self._state_path) as data:
+                state_ring = data["state_ring"]
+                conf_ring = data["conf_ring"]
+                ring_pos = data["ring_pos"]
+                ring_len = data["ring_len"]
+                status_codes = data["status_codes"]
+                confidences = data["confidences"]
+                last_notifications = data["last_notifications"]
+        except Exception as e:
+            print(f"ランプ状態の読み込みエラー: {e}")
+            return
         
-        # 赤色判定
-        red_ratio = self.calculate_red_ratio(hsv, bright_mask)
-        if red_ratio >= self.logic_config["red_ratio_thresh"]:
-            return "RED", red_ratio
+        window = self._frames_window
+        if (state_ring.shape != (12, window) or conf_ring.shape != (12, window)
+                or ring_pos.shape != (12,) or ring_len.shape != (12,)
+                or status_codes.shape != (12,) or confidences.shape != (12,)
+                or last_notifications.shape != (12,)
+                or state_ring.max() >= len(STATE_NAMES) or status_codes.max() >= len(STATE_NAMES)):
+            print("保存されたランプ状態が現在の設定と一致しないため破棄します")
+            return
         
-        # 緑色判定
-        green_ratio = self.calculate_green_ratio(hsv, bright_mask)
-        if green_ratio >= self.logic_config["green_ratio_thresh"]:
-            return "GREEN", green_ratio
+        self._state_ring[:] = state_ring
+        self._conf_ring[:] = conf_ring
+        self._ring_pos = [int(pos) % window for pos in ring_pos]
+        self._ring_len = [min(max(int(length), 0), window) for length in ring_len]
+        
+        # 状態ごとの件数と信頼度の合計は履歴から再計算
+        for row in range(12):
+            state_count = [0] * len(STATE_NAMES)
+            conf_sum = [0.0] * len(STATE_NAMES)
+            # 窓が埋まるまでは先頭から順に書き込まれている
+            for code, confidence in zip(state_ring[row, :self._ring_len[row]].tolist(),
+                                        conf_ring[row, :self._ring_len[row]].tolist()):
+                state_count[code] += 1
+                conf_sum[code] += confidence
+            self._state_count[row] = state_count
+            self._conf_sum[row] = conf_sum
+            
+            status = self.lamp_statuses[row + 1]
+            status.state = STATE_NAMES[int(status_codes[row])]
+            status.confidence = float(confidences[row])
+            status.last_notification = float(last_notifications[row])
         
-        return "UNKNOWN", 0.0
+        print(f"前回のランプ状態を復元しました: {self._state_path}")
     
-    def calculate_red_ratio(self, hsv: np.ndarray, bright_mask: np.ndarray) -> float:
-        """赤色の面積比を計算"""
-        red_hue_ranges = self.logic_config["red_hue_range"]
-        red_sat_min = self.logic_config["red_sat_min"]
-        red_val_min = self.logic_config["red_val_min"]
+    def _build_roi_stack(self, frame_shape: Tuple[int, ...]):
+        """全ROIを縦に積み重ねた解析用画像のレイアウトを作成（フレームサイズ変更時のみ）
         
-        red_mask = np.zeros(hsv.shape[:2], dtype=bool)
+        ROI間には形態学的処理のカーネル半径分の余白行を挟み、隣のROIの画素が
+        収縮・膨張に影響しないようにする。十分な大きさのROIは縮小して格納する
+        """
+        frame_h, frame_w = frame_shape[:2]
+        gap = self._morph_kernel.shape[0] // 2
         
-        # 赤色相は0-10と170-180の2つの範囲
-        for hue_range in red_hue_ranges:
-            hue_min, hue_max = hue_range
-            hue_mask = (hsv[:, :, 0] >= hue_min) & (hsv[:, :, 0] <= hue_max)
-            sat_mask = hsv[:, :, 1] >= red_sat_min
-            val_mask = hsv[:, :, 2] >= red_val_min
+        layout = []
+        row = 0
+        for lamp_id in range(1, 13):
+            roi_key = f"lamp_{lamp_id}"
+            if roi_key not in self.rois:
+                continue
             
-            red_mask |= hue_mask & sat_mask & val_mask
-        
-        red_mask &= bright_mask
-        
-        # 形態学的処理でノイズ除去
-        kernel_size = self.logic_config["morphological_kernel"]
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
-        red_mask = cv2.morphologyEx(red_mask.astype(np.uint8), cv2.MORPH_OPEN, kernel)
-        
-        total_pixels = np.sum(bright_mask)
-        red_pixels = np.sum(red_mask)
-        
-        return red_pixels / total_pixels if total_pixels > 0 else 0.0
+            x, y, w, h = self.rois[roi_key]
+            if x < 0 or y < 0 or x + w > frame_w or y + h > frame_h:
+                continue
+            
+            if w <= 0 or h <= 0:
+                # 空のROIは常にUNKNOWN
+                layout.append((lamp_id, x, y, w, h, None, 0, 0))
+                continue
+            
+            # 短辺32px未満のROIは縮小すると色の情報が失われるためそのまま使う
+            factor = self._downsample_factor
+            if factor > 1 and min(w, h) >= 32:
+                stack_w, stack_h = max(1, w // factor), max(1, h // factor)
+            else:
+                stack_w, stack_h = w, h
+            
+            layout.append((lamp_id, x, y, w, h, row, stack_w, stack_h))
+            row += stack_h + gap
+        
+        stack_h = max(row - gap, 1)
+        stack_w = max([sw for *_, r, sw, _ in layout if r is not None], default=1)
+        
+        # ROI画素の位置（255）と余白（0）を表すマスク
+        valid = np.zeros((stack_h, stack_w), dtype=np.uint8)
+        for *_, r, sw, sh in layout:
+            if r is not None:
+                valid[r:r+sh, :sw] = 255
+        
+        self._stack_shape = frame_shape[:2]
+        self._stack_layout = layout
+        self._stack_bgr = np.zeros((stack_h, stack_w, 3), dtype=np.uint8)
+        self._stack_valid = valid
+        
+        # フレームごとの処理結果を受ける作業用バッファ（dst引数で再利用し、毎フレームの確保を避ける）
+        self._stack_hsv = np.empty((stack_h, stack_w, 3), dtype=np.uint8)
+        self._stack_bright = np.empty((stack_h, stack_w), dtype=np.uint8)
+        self._stack_red = np.empty((stack_h, stack_w), dtype=np.uint8)
+        self._stack_green = np.empty((stack_h, stack_w), dtype=np.uint8)
+        self._stack_tmp = np.empty((stack_h, stack_w), dtype=np.uint8)
+        self._stack_red_open = np.empty((stack_h, stack_w), dtype=np.uint8)
+        self._stack_green_open = np.empty((stack_h, stack_w), dtype=np.uint8)
+        
+        # 各ROIの切り出し元と書き込み先（スタック内のビュー）
+        # 幅の異なるROIのビューは非連続になるため、縮小結果は一時バッファで受けてからコピーする
+        self._stack_copies = []
+        for _, x, y, w, h, r, sw, sh in layout:
+            if r is None:
+                continue
+            dst = self._stack_bgr[r:r+sh, :sw]
+            resize = (sw, sh) != (w, h)
+            buf = None
+            if resize and not dst.flags.c_contiguous:
+                buf = np.empty((sh, sw, 3), dtype=np.uint8)
+            self._stack_copies.append((x, y, w, h, dst, resize, buf))
+        self._stack_pad = cv2.bitwise_not(valid)
+        # ROIごとの行範囲と幅（画素数の集計用）
+        self._stack_slices = [(r, r + sh, sw) for *_, r, sw, sh in layout if r is not None]
+        # 微小ROI（形態学的処理を省略する領域）の行範囲と幅
+        self._stack_raw_rows = [
+            (r, r + sh, sw) for *_, r, sw, sh in layout
+            if r is not None and sw * sh < self._morph_skip_px
+        ]
     
-    def calculate_green_ratio(self, hsv: np.ndarray, bright_mask: np.ndarray) -> float:
-        """緑色の面積比を計算"""
-        green_hue_range = self.logic_config["green_hue_range"]
-        green_sat_min = self.logic_config["green_sat_min"]
-        green_val_min = self.logic_config["green_val_min"]
-        
-        hue_min, hue_max = green_hue_range
-        hue_mask = (hsv[:, :, 0] >= hue_min) & (hsv[:, :, 0] <= hue_max)
-        sat_mask = hsv[:, :, 1] >= green_sat_min
-        val_mask = hsv[:, :, 2] >= green_val_min
-        
-        green_mask = hue_mask & sat_mask & val_mask & bright_mask
+    def open_stack_mask(self, mask: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """積み重ねたマスクにROI単位のオープニングを適用（微小ROIでは省略）
         
-        # 形態学的処理でノイズ除去
-        kernel_size = self.logic_config["morphological_kernel"]
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
-        green_mask = cv2.morphologyEx(green_mask.astype(np.uint8), cv2.MORPH_OPEN, kernel)
+        収縮時は余白を255、膨張時は0にしておくことで、ROIごとに
+        cv2.morphologyEx(MORPH_OPEN) を行った場合と同じ結果になる
+        """
+        cv2.bitwise_or(mask, self._stack_pad, dst=mask)
+        eroded = cv2.erode(mask, self._morph_kernel, dst=self._stack_tmp)
+        cv2.bitwise_and(eroded, self._stack_valid, dst=eroded)
+        opened = cv2.dilate(eroded, self._morph_kernel, dst=out)
         
-        total_pixels = np.sum(bright_mask)
-        green_pixels = np.sum(green_mask)
+        for row_start, row_end, w in self._stack_raw_rows:
+            opened[row_start:row_end, :w] = mask[row_start:row_end, :w]
         
-        return green_pixels / total_pixels if total_pixels > 0 else 0.0
+        return opened
+    
+    def count_per_roi(self, mask: np.ndarray) -> List[int]:
+        """積み重ねたマスク（uint8）のROIごとの非ゼロ画素数を返す"""
+        return [cv2.countNonZero(mask[row_start:row_end, :w]) for row_start, row_end, w in self._stack_slices]
     
     def update_lamp_status(self, lamp_id: int, state: str, confidence: float):
         """ランプ状態を更新（多数決フィルタ適用）"""
-        # 履歴に追加
-        self.lamp_history[lamp_id].append((state, confidence))
-        
-        # 多数決で最終状態を決定
-        if len(self.lamp_history[lamp_id]) >= self.logic_config["frames_window"]:
-            states = [item[0] for item in self.lamp_history[lamp_id]]
-            state_counts = {s: states.count(s) for s in set(states)}
-            final_state = max(state_counts, key=state_counts.get)
+        row = lamp_id - 1
+        state_count = self._state_count[row]
+        conf_sum = self._conf_sum[row]
+        code = STATE_CODES[state]
+        confidence = float(confidence)
+        
+        # 窓が埋まっていれば追い出される最古の要素の寄与を差し引く
+        pos = self._ring_pos[row]
+        if self._ring_len[row] >= self._frames_window:
+            old_code = int(self._state_ring[row, pos])
+            state_count[old_code] -= 1
+            if state_count[old_code] == 0:
+                conf_sum[old_code] = 0.0  # 浮動小数点の誤差が残らないようにリセット
+            else:
+                conf_sum[old_code] -= float(self._conf_ring[row, pos])
+        else:
+            self._ring_len[row] += 1
+        
+        # 履歴に追加（最古の要素を上書き）
+        self._state_ring[row, pos] = code
+        self._conf_ring[row, pos] = confidence
+        state_count[code] += 1
+        conf_sum[code] += float(self._conf_ring[row, pos])
+        self._ring_pos[row] = (pos + 1) % self._frames_window
+        
+        # 多数決で最終状態を決定（同数の場合はコードの小さい状態を優先）
+        if self._ring_len[row] >= self._frames_window:
+            final_code = max(range(len(STATE_NAMES)), key=state_count.__getitem__)
+            final_state = STATE_NAMES[final_code]
             
             # 信頼度は平均値
-            confidences = [item[1] for item in self.lamp_history[lamp_id] if item[0] == final_state]
-            final_confidence = np.mean(confidences) if confidences else 0.0
+            final_confidence = conf_sum[final_code] / state_count[final_code]
             
             # 状態が変化した場合のみ更新
             if self.lamp_statuses[lamp_id].state != final_state:
@@ -261,7 +456,7 @@ class LampDetector:
                     self.send_notification(lamp_id, final_state, final_confidence)
     
     def send_notification(self, lamp_id: int, state: str, confidence: float):
-        """Cloudflare Workersに通知を送信"""
+        """Cloudflare Workersへの通知を送信キューに登録"""
         current_time = time.time()
         last_notification = self.lamp_statuses[lamp_id].last_notification
         min_interval = self.notify_config["min_interval_sec"]
@@ -271,17 +466,97 @@ class LampDetector:
             print(f"ランプ {lamp_id}: 通知間隔が短いためスキップ ({current_time - last_notification:.1f}秒)")
             return
         
-        # 通知データ作成
+        # 送信はワーカースレッドに任せ、フレーム処理をブロックしない
+        try:
+            self._notify_queue.put_nowait((lamp_id, state, float(confidence), current_time))
+        except queue.Full:
+            print(f"ランプ {lamp_id}: 通知キューが満杯のため通知を破棄しました")
+            return
+        
+        # 送信完了を待たずに通知間隔を開始し、送信中に同じ通知が重ねて登録されないようにする
+        # （送信に失敗した場合はワーカースレッドが元に戻す）
+        self.lamp_statuses[lamp_id].last_notification = current_time
+    
+    def _notify_worker(self):
+        """通知キューを消費してCloudflare Workersへ送信（ワーカースレッド）
+        
+        最初の1件を受け取ってから一定時間内に届いた通知をまとめ、1回のPOSTで送る
+        """
+        while True:
+            events = [self._notify_queue.get()]
+            deadline = time.monotonic() + self._notify_batch_window
+            while len(events) < self._notify_batch_max:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    events.append(self._notify_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            try:
+                self._post_notification(events)
+            finally:
+                for _ in events:
+                    self._notify_queue.task_done()
+    
+    def _build_notification_data(self, events: List[Tuple[int, str, float, float]]) -> Dict:
+        """通知イベント群から送信データを作成（複数件はバッチ形式にまとめる）"""
+        # 同じランプが複数回含まれる場合は最新のものだけを残す
+        latest = {}
+        for event in events:
+            latest[event[0]] = event
+        events = [latest[lamp_id] for lamp_id in sorted(latest)]
+        
+        lamp_id, state, confidence, current_time = events[0]
         notification_data = {
-            "timestamp": int(current_time),
+            "timestamp": int(max(event[3] for event in events)),
             "lamp_id": lamp_id,
             "state": state,
-            "confidence": float(confidence),
-            "message": f"ランプ {lamp_id} が {state} 状態になりました",
+            "confidence": confidence,
         }
-
+        
+        if len(events) == 1:
+            notification_data["message"] = f"ランプ {lamp_id} が {state} 状態になりました"
+        else:
+            # Cloudflare Workersはmessageのみを転送するため、ランプ一覧はmessageに含める
+            lamp_ids = [event[0] for event in events]
+            lamp_list = ", ".join(f"{event[0]}({event[1]})" for event in events)
+            notification_data["message"] = f"複数のランプが状態変化しました: ランプ {lamp_list} ({len(events)}個)"
+            notification_data["batch_size"] = len(events)
+            notification_data["lamp_ids"] = lamp_ids
+        
+        return notification_data
+    
+    def _wait_for_rate_limit(self):
+        """トークンバケットで送信レートを制限（トークンが無ければ補充まで待機）"""
+        now = time.monotonic()
+        elapsed = now - self._notify_token_time
+        self._notify_tokens = min(self._notify_rate, self._notify_tokens + elapsed * self._notify_rate)
+        self._notify_token_time = now
+        
+        if self._notify_tokens < 1.0:
+            time.sleep((1.0 - self._notify_tokens) / self._notify_rate)
+            self._notify_tokens = 1.0
+            self._notify_token_time = time.monotonic()
+        
+        self._notify_tokens -= 1.0
+    
+    def _post_notification(self, events: List[Tuple[int, str, float, float]]):
+        """まとめた通知を1回だけ署名してPOST（HTTP 429等の再試行はセッションのRetry設定に任せる）"""
+        request_url = self.notify_config["worker_url"]
+        notification_data = self._build_notification_data(events)
+        lamp_ids = notification_data.get("lamp_ids", [notification_data["lamp_id"]])
+        lamp_label = ", ".join(str(lamp_id) for lamp_id in lamp_ids)
+        
+        # ★ JSONへのシリアライズは1回だけ行い、署名と送信で同じバイト列を使う
+        # 区切りの空白を省き、日本語は\uXXXXにエスケープせずUTF-8のまま送る（ペイロードを縮小）
+        payload_bytes = json.dumps(
+            notification_data, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+        ).encode('utf-8')
+        
         # ★ 署名を生成
-        signature = self.create_signature(notification_data)
+        signature = self.create_signature(payload_bytes)
     
         # ★ ヘッダーに署名を追加
         headers = {
@@ -289,46 +564,120 @@ class LampDetector:
             "X-Signature-256": signature  # 署名をヘッダーに追加
         }
         
+        print(f"通知送信先URL: {request_url}")
+        print(f"通知データ: {payload_bytes.decode('utf-8')}")
+        print(f"ヘッダー: {headers}")
+        
+        self._wait_for_rate_limit()
+        
         try:
-            request_url = self.notify_config["worker_url"]
-            # dumpsを使用してデータをJSON文字列に変換
-            data_payload = json.dumps(notification_data, sort_keys=True)
-            
-            print(f"通知送信先URL: {request_url}")
-            print(f"通知データ: {data_payload}")
-            print(f"ヘッダー: {headers}")
-
-            response = requests.post(
+            response = self._session.post(
                 request_url,
-                data=data_payload.encode('utf-8'), # data引数でバイトとして送信
+                data=payload_bytes, # data引数でバイトとして送信
                 headers=headers,
                 timeout=10
             )
             
             if response.status_code == 200:
-                print(f"ランプ {lamp_id}: 通知送信成功")
-                self.lamp_statuses[lamp_id].last_notification = current_time
-            else:
-                print(f"ランプ {lamp_id}: 通知送信失敗 (HTTP {response.status_code}) - {response.text}")
+                print(f"ランプ {lamp_label}: 通知送信成功")
+                return
+            print(f"ランプ {lamp_label}: 通知送信失敗 (HTTP {response.status_code}) - {response.text}")
                 
         except requests.RequestException as e:
-            print(f"ランプ {lamp_id}: 通知送信エラー - {e}")
+            print(f"ランプ {lamp_label}: 通知送信エラー - {e}")
+        
+        # 送信できなかったランプは次の検出で再通知できるよう通知間隔を解除する
+        # （その後に新しい通知が登録されていれば、そちらの時刻を残す）
+        for lamp_id, _, _, current_time in events:
+            status = self.lamp_statuses[lamp_id]
+            if status.last_notification == current_time:
+                status.last_notification = 0.0
     
-    def create_signature(self, data: Dict) -> str:
-        """HMAC署名を作成"""
-        secret = self.notify_config["secret"].encode('utf-8')
-        # ★ requestsで送るペイロードと完全に同じものから署名を生成
-        message = json.dumps(data, sort_keys=True).encode('utf-8')
-        signature = hmac.new(secret, message, hashlib.sha256).hexdigest()
+    def create_signature(self, payload_bytes: bytes) -> str:
+        """HMAC署名を作成（requestsで送るペイロードと完全に同じバイト列から生成）"""
+        # hmac.digest はHMACオブジェクトを作らずにC実装で一括計算する
+        signature = hmac.digest(self._secret, payload_bytes, "sha256").hex()
         return f"sha256={signature}"
     
+    def analyze_frame(self, frame: np.ndarray) -> List[Tuple[int, str, float]]:
+        """フレーム内の各ランプを解析して (ランプID, 状態, 信頼度) のリストを返す
+        
+        全ROIを（縮小して）1枚の画像に積み重ね、HSV変換・色判定・ノイズ除去を1回ずつで済ませる
+        """
+        if frame.shape[:2] != self._stack_shape:
+            self._build_roi_stack(frame.shape)
+        
+        if not self._stack_slices:
+            return [(lamp_id, "UNKNOWN", 0.0) for lamp_id, *_ in self._stack_layout]
+        
+        for x, y, w, h, dst, resize, buf in self._stack_copies:
+            roi = frame[y:y+h, x:x+w]
+            if not resize:
+                dst[...] = roi
+            elif buf is None:
+                # 面積平均で縮小し、支配的な色の比率を保つ
+                cv2.resize(roi, dst.shape[1::-1], dst=dst, interpolation=cv2.INTER_AREA)
+            else:
+                cv2.resize(roi, buf.shape[1::-1], dst=buf, interpolation=cv2.INTER_AREA)
+                dst[...] = buf
+        
+        hsv = cv2.cvtColor(self._stack_bgr, cv2.COLOR_BGR2HSV, dst=self._stack_hsv)
+        
+        # 明度フィルタ（余白は集計時にROI単位で切り出すため除外不要）
+        bright_mask = cv2.inRange(hsv, self._bright_lower, self._bright_upper, dst=self._stack_bright)
+        
+        # 赤色相は0-10と170-180の2つの範囲
+        (lower, upper), *other_bounds = self._red_bounds
+        red_mask = cv2.inRange(hsv, lower, upper, dst=self._stack_red)
+        for lower, upper in other_bounds:
+            cv2.bitwise_or(red_mask, cv2.inRange(hsv, lower, upper, dst=self._stack_tmp), dst=red_mask)
+        
+        green_mask = cv2.inRange(hsv, self._green_lower, self._green_upper, dst=self._stack_green)
+        
+        # 形態学的処理でノイズ除去
+        red_mask = self.open_stack_mask(red_mask, self._stack_red_open)
+        green_mask = self.open_stack_mask(green_mask, self._stack_green_open)
+        
+        bright_counts = self.count_per_roi(bright_mask)
+        red_counts = self.count_per_roi(red_mask)
+        green_counts = self.count_per_roi(green_mask)
+        
+        results = []
+        index = 0
+        for lamp_id, *_, row, _, _ in self._stack_layout:
+            if row is None:
+                results.append((lamp_id, "UNKNOWN", 0.0))
+                continue
+            
+            total_pixels = bright_counts[index]
+            red_pixels = red_counts[index]
+            green_pixels = green_counts[index]
+            index += 1
+            
+            if total_pixels == 0:
+                results.append((lamp_id, "UNKNOWN", 0.0))
+                continue
+            
+            red_ratio = red_pixels / total_pixels
+            green_ratio = green_pixels / total_pixels
+            if red_ratio >= self._red_thresh:
+                results.append((lamp_id, "RED", red_ratio))
+            elif green_ratio >= self._green_thresh:
+                results.append((lamp_id, "GREEN", green_ratio))
+            else:
+                results.append((lamp_id, "UNKNOWN", 0.0))
+        return results
+    
     def process_frame(self, frame: np.ndarray):
         """フレームを処理してランプ状態を判定"""
-        for lamp_id in range(1, 13):
-            roi = self.extract_roi(frame, lamp_id)
-            if roi is not None:
-                state, confidence = self.analyze_color(roi)
-                self.update_lamp_status(lamp_id, state, confidence)
+        # 前フレームと同じ読み取り専用の配列なら解析結果を再利用（多数決履歴への追加は継続）
+        # 内容のハッシュは解析より高くつくため、同一性だけで判定する（書き込み可能な配列は毎回解析）
+        if frame is not self._last_frame or frame.flags.writeable:
+            self._last_frame = frame
+            self._last_results = self.analyze_frame(frame)
+        
+        for lamp_id, state, confidence in self._last_results:
+            self.update_lamp_status(lamp_id, state, confidence)
 
 class SyntheticMonitor:
     """合成フレーム監視システム"""
@@ -338,35 +687,30 @@ class SyntheticMonitor:
         self.detector = LampDetector()
         self.running = False
         
-    def create_test_frame(self) -> np.ndarray:
-        """テスト用のフレームを生成"""
+        # ランプ1・2の赤/緑の組み合わせ（4通り）を事前に描画しておく
+        # フレームは参照で返すため書き込み禁止にする
+        self._frame_variants = {}
+        for lamp1_red in (False, True):
+            for lamp2_red in (False, True):
+                frame = self._build_frame(lamp1_red, lamp2_red)
+                frame.setflags(write=False)
+                self._frame_variants[(lamp1_red, lamp2_red)] = frame
+        
+    def _build_frame(self, lamp1_red: bool, lamp2_red: bool) -> np.ndarray:
+        """指定したランプ1・2の状態でテスト用のフレームを描画"""
         # 疑似ダッシュボードと同じサイズのフレームを作成
         window_size = self.detector.config["synthetic"]["window_size"]
         frame = np.full((window_size[1], window_size[0], 3), (50, 50, 50), dtype=np.uint8)
         
-        # 現在時刻に基づいてランプ状態を変化させる（テスト用）
-        current_time = time.time()
-        
         for lamp_id in range(1, 13):
             roi_key = f"lamp_{lamp_id}"
             if roi_key in self.detector.rois:
                 x, y, w, h = self.detector.rois[roi_key]
                 
-                # 時間に基づいてランプ状態を決定（デモ用）
-                # ランプ1は10秒ごとに赤/緑を切り替え
-                if lamp_id == 1:
-                    if int(current_time / 10) % 2 == 0:
-                        color = (0, 255, 0)  # 緑
-                    else:
-                        color = (0, 0, 255)  # 赤
-                # ランプ2は15秒ごとに赤/緑を切り替え
-                elif lamp_id == 2:
-                    if int(current_time / 15) % 2 == 0:
-                        color = (0, 255, 0)  # 緑
-                    else:
-                        color = (0, 0, 255)  # 赤
+                if (lamp_id == 1 and lamp1_red) or (lamp_id == 2 and lamp2_red):
+                    color = (0, 0, 255)  # 赤
                 else:
-                    color = (0, 255, 0)  # その他は緑
+                    color = (0, 255, 0)  # 緑
                 
                 # ランプを描画
                 cv2.rectangle(frame, (x, y), (x + w, y + h), color, -1)
@@ -381,6 +725,17 @@ class SyntheticMonitor:
         
         return frame
     
+    def create_test_frame(self) -> np.ndarray:
+        """テスト用のフレームを取得（事前描画済みフレームを参照で返す、読み取り専用）"""
+        # 現在時刻に基づいてランプ状態を変化させる（テスト用）
+        current_time = time.time()
+        
+        # ランプ1は10秒ごと、ランプ2は15秒ごとに赤/緑を切り替え（デモ用）
+        lamp1_red = int(current_time / 10) % 2 == 1
+        lamp2_red = int(current_time / 15) % 2 == 1
+        
+        return self._frame_variants[(lamp1_red, lamp2_red)]
+    
     def capture_synthetic_frame(self) -> Optional[np.ndarray]:
         """合成フレームを取得（テスト用実装）"""
         try:
@@ -398,6 +753,11 @@ class SyntheticMonitor:
         self.running = True
         frame_count = 0
         
+        # 判定レート（monotonicな時刻で次回実行時刻を管理し、処理時間による遅れを吸収）
+        detect_fps = self.detector.config.get("monitor", {}).get("detect_fps", 5)
+        frame_interval = 1.0 / detect_fps
+        next_tick = time.monotonic()
+        
         try:
             while self.running:
                 # フレームキャプチャ（簡略化）
@@ -412,7 +772,13 @@ class SyntheticMonitor:
                         print(f"処理フレーム数: {frame_count}")
                 
                 # フレームレート制御
-                time.sleep(1.0 / 20)  # 20 FPS
+                next_tick += frame_interval
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    # 処理が間に合わなかった場合は追いつこうとせず次回から仕切り直す
+                    next_tick = time.monotonic()
                 
         except KeyboardInterrupt:
             print("\nキーボード割り込みで終了します")
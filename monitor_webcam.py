@@ -51,22 +51,27 @@ import numpy as np
 import yaml
 import time
 import requests
-import hashlib
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import hmac
 import json
 import os
 import re
-from collections import deque
+import queue
+import threading
 from typing import Dict, List, Tuple, Optional
-from dataclasses import dataclass
 
-@dataclass
-class LampStatus:
-    """ランプ状態を表すデータクラス"""
-    lamp_id: int
-    state: str  # "RED", "GREEN", "UNKNOWN"
-    confidence: float
-    last_notification: float = 0.0
+# YAMLの読み込みにはlibyamlのCローダーを優先して使う（未ビルド環境では純Python版）
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# 信頼度（0.0〜1.0）を履歴に格納する際の固定小数点の倍率（uint16、0〜10000）
+CONF_SCALE = 10000
+
+# ランプ状態の整数コード（判定処理では整数で扱い、表示・通知時のみ名前に変換）
+STATE_UNKNOWN, STATE_RED, STATE_GREEN = 0, 1, 2
+STATE_NAMES = ("UNKNOWN", "RED", "GREEN")
+# デバッグ表示の状態ごとの色 (BGR)
+STATE_COLORS = ((128, 128, 128), (0, 0, 255), (0, 255, 0))  # 灰色, 赤, 緑
 
 class LampDetector:
     """ランプ検出・判定クラス（高速化版）"""
@@ -77,14 +82,91 @@ class LampDetector:
         
         # 遅延初期化用フラグ
         self._initialized = False
-        self.lamp_history = None
-        self.lamp_statuses = None
+        self.lamp_states = None
+        self.lamp_confidences = None
+        self.last_notifications = None
         
         # 設定値の取得
         self.logic_config = self.config["logic"]
         self.notify_config = self.config["notify"]
         self.rois = self.config["rois"]
         
+        # 設定済みROIの (ランプID, x, y, w, h) を一度だけ整数に展開（フレームごとにキー文字列を組み立てない）
+        self._roi_bounds = [
+            (lamp_id, *(int(v) for v in self.rois[f"lamp_{lamp_id}"]))
+            for lamp_id in range(1, 13) if f"lamp_{lamp_id}" in self.rois
+        ]
+        
+        # HMAC署名用の鍵（通知のたびにエンコードしない）
+        self._secret = self.notify_config["secret"].encode('utf-8')
+        
+        # 判定ロジックの設定値をフレームごとに辞書参照しないよう事前に展開
+        self._frames_window = self.logic_config["frames_window"]
+        self._min_brightness = np.uint8(self.logic_config["min_brightness_v"])
+        self._red_hue_ranges = np.array(self.logic_config["red_hue_range"], dtype=np.uint8)
+        self._red_sat_min = np.uint8(self.logic_config["red_sat_min"])
+        self._red_val_min = np.uint8(self.logic_config["red_val_min"])
+        self._green_hue_min, self._green_hue_max = np.array(self.logic_config["green_hue_range"], dtype=np.uint8)
+        self._green_sat_min = np.uint8(self.logic_config["green_sat_min"])
+        self._green_val_min = np.uint8(self.logic_config["green_val_min"])
+        self._red_thresh = self.logic_config["red_ratio_thresh"]
+        self._green_thresh = self.logic_config["green_ratio_thresh"]
+        
+        # cv2.inRange用のHSV下限・上限（明度フィルタはV下限に含めて1パスで判定）
+        self._bright_lower = np.array([0, 0, self._min_brightness], dtype=np.uint8)
+        self._bright_upper = np.array([255, 255, 255], dtype=np.uint8)
+        red_val_floor = max(self._red_val_min, self._min_brightness)
+        self._red_bounds = [
+            (np.array([hue_min, self._red_sat_min, red_val_floor], dtype=np.uint8),
+             np.array([hue_max, 255, 255], dtype=np.uint8))
+            for hue_min, hue_max in self._red_hue_ranges
+        ]
+        green_val_floor = max(self._green_val_min, self._min_brightness)
+        self._green_lower = np.array([self._green_hue_min, self._green_sat_min, green_val_floor], dtype=np.uint8)
+        self._green_upper = np.array([self._green_hue_max, 255, 255], dtype=np.uint8)
+        
+        # 形態学的処理のカーネルは設定から一度だけ生成
+        kernel_size = self.logic_config["morphological_kernel"]
+        if kernel_size > 5:
+            # 大きな楕円カーネルは汎用の遅い処理になるため、3x3十字カーネルの反復で近似する
+            self._morph_kernel = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
+            self._morph_iterations = (kernel_size - 1) // 2
+        else:
+            self._morph_kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
+            self._morph_iterations = 1
+        # この画素数未満の小さなROIでは形態学的処理を省略（ノイズ除去効果よりコストが勝るため）
+        self._morph_skip_px = self.logic_config.get("morphological_skip_px", 0)
+        
+        # 色判定前にROIを縮小する倍率（既定の1は縮小なし）
+        # オープニングのカーネルは縮小後の画像に掛かり元画像上では倍率分大きく効くため、
+        # 2以上にすると細い点灯領域が除去されて判定が変わることがある
+        self._downsample_factor = max(1, int(self.logic_config.get("roi_downsample_factor", 1)))
+        
+        # OpenCL（Transparent API）で色判定・ノイズ除去を行うか（GPUが使えない環境ではCPU処理）
+        self._use_opencl = bool(self.logic_config.get("use_opencl", False))
+        if self._use_opencl:
+            if cv2.ocl.haveOpenCL():
+                cv2.ocl.setUseOpenCL(True)
+                print("OpenCLを使用して色判定を行います")
+            else:
+                self._use_opencl = False
+                print("OpenCLが利用できないためCPUで色判定を行います")
+        
+        # ROIを積み重ねた解析用画像のレイアウト（最初のフレームのサイズで作成）
+        self._stack_shape = None
+        
+        # 変化検知: 前回解析時の積み重ね画像と解析結果
+        self._change_thresh = float(self.logic_config.get("change_threshold", 0.0))
+        self._last_stack = None
+        self._stack_diff = None
+        self._last_results = []
+        
+        # デバッグ表示用のバッファ（フレームサイズが変わったときだけ確保し直す）
+        self._overlay_buf = None
+        # ROI枠・状態表示の描画内容（座標・文字列・色、状態が変わったときだけ作り直す）
+        self._overlay_draw_cache = []
+        self._overlay_dirty = True
+        
         # 通知バッチ処理用
         self.pending_notifications = []
         self.last_batch_notification = 0.0
@@ -92,158 +174,354 @@ class LampDetector:
         self.first_red_detection_time = None  # 最初の赤色検出時刻
         self.batch_collection_window = 2.0  # 赤色検出後の収集期間
         
+        # 接続を使い回すセッション（接続失敗と429だけをRetry-Afterを尊重して自動再試行）
+        # POSTは冪等ではないため、読み取りタイムアウトや5xxでは再送しない（同じ通知が重複して届くため）
+        retry = Retry(
+            total=3,
+            connect=3,
+            read=0,
+            status=3,
+            backoff_factor=1,
+            status_forcelist=[429],
+            allowed_methods=frozenset({"POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=retry)
+        self._session = requests.Session()
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        
+        # HTTP送信はワーカースレッドで行い、検出ループをブロックしない
+        self._notify_queue = queue.Queue(maxsize=64)
+        self._notify_thread = threading.Thread(target=self._notify_worker, daemon=True)
+        self._notify_thread.start()
+        
         print("ランプ検出システムを初期化しました（遅延初期化モード）")
     
     def _lazy_init(self):
         """遅延初期化 - 最初のフレーム処理時に実行"""
         if not self._initialized:
-            self.lamp_history = {i: deque(maxlen=self.logic_config["frames_window"]) 
-                               for i in range(1, 13)}
-            self.lamp_statuses = {i: LampStatus(i, "UNKNOWN", 0.0) for i in range(1, 13)}
+            # 履歴はランプごと（行 = lamp_id - 1）の固定長リングバッファ
+            self._state_ring = np.zeros((12, self._frames_window), dtype=np.uint8)
+            self._conf_ring = np.zeros((12, self._frames_window), dtype=np.uint16)
+            self.reset_history()
+            # ランプ状態はランプごとの配列（行 = lamp_id - 1）で保持
+            self.lamp_states = np.full(12, STATE_UNKNOWN, dtype=np.uint8)
+            self.lamp_confidences = np.zeros(12, dtype=np.float32)
+            self.last_notifications = np.zeros(12, dtype=np.float64)
             self._initialized = True
-            print(f"遅延初期化完了 - フレーム窓サイズ: {self.logic_config['frames_window']}")
+            print(f"遅延初期化完了 - フレーム窓サイズ: {self._frames_window}")
     
-    def extract_roi(self, frame: np.ndarray, lamp_id: int) -> Optional[np.ndarray]:
-        """ROI領域を抽出"""
-        roi_key = f"lamp_{lamp_id}"
-        if roi_key not in self.rois:
-            return None
+    def reset_history(self):
+        """多数決用の履歴（リングバッファと状態ごとの集計）を空にする"""
+        self._ring_pos = [0] * 12
+        self._ring_len = [0] * 12
+        # 窓内の状態ごとの件数・信頼度合計（追加/追い出しのたびに差分更新、信頼度は固定小数点の整数）
+        self._state_count = [[0] * len(STATE_NAMES) for _ in range(12)]
+        self._conf_sum = [[0] * len(STATE_NAMES) for _ in range(12)]
+        # 次のフレームは変化の有無によらず解析し直す
+        self._last_stack = None
+    
+    def _build_roi_stack(self, frame_shape: Tuple[int, ...]):
+        """全ROIを縦に積み重ねた解析用画像のレイアウトを作成（フレームサイズ変更時のみ）
         
-        x, y, w, h = self.rois[roi_key]
-        if x < 0 or y < 0 or x + w > frame.shape[1] or y + h > frame.shape[0]:
-            return None
+        ROI間には形態学的処理のカーネル半径分の余白行を挟み、隣のROIの画素が
+        収縮・膨張に影響しないようにする。十分な大きさのROIは縮小して格納する
+        """
+        frame_h, frame_w = frame_shape[:2]
+        gap = self._morph_kernel.shape[0] // 2
+        
+        layout = []
+        row = 0
+        for lamp_id, x, y, w, h in self._roi_bounds:
+            if x < 0 or y < 0 or x + w > frame_w or y + h > frame_h:
+                # 範囲外のROIは判定対象外（レイアウト作成時に一度だけ警告）
+                print(f"警告: ランプ {lamp_id} のROI [{x}, {y}, {w}, {h}] がフレーム {frame_w}x{frame_h} の範囲外のため判定しません")
+                continue
+            
+            if w <= 0 or h <= 0:
+                # 空のROIは常にUNKNOWN
+                layout.append((lamp_id, x, y, w, h, None, 0, 0))
+                continue
+            
+            # 短辺32px未満のROIは縮小すると色の情報が失われるためそのまま使う
+            factor = self._downsample_factor
+            if factor > 1 and min(w, h) >= 32:
+                stack_w, stack_h = max(1, w // factor), max(1, h // factor)
+            else:
+                stack_w, stack_h = w, h
+            
+            layout.append((lamp_id, x, y, w, h, row, stack_w, stack_h))
+            row += stack_h + gap
+        
+        stack_h = max(row - gap, 1)
+        stack_w = max([sw for *_, r, sw, _ in layout if r is not None], default=1)
+        
+        # ROI画素の位置（255）と余白（0）を表すマスク
+        valid = np.zeros((stack_h, stack_w), dtype=np.uint8)
+        for *_, r, sw, sh in layout:
+            if r is not None:
+                valid[r:r+sh, :sw] = 255
         
-        return frame[y:y+h, x:x+w]
+        self._stack_shape = frame_shape[:2]
+        self._stack_layout = layout
+        self._last_stack = None
+        self._stack_bgr = np.zeros((stack_h, stack_w, 3), dtype=np.uint8)
+        self._stack_valid = valid
+        
+        # 各ROIの切り出し元と書き込み先（スタック内のビュー）
+        # 幅の異なるROIのビューは非連続になるため、縮小結果は一時バッファで受けてからコピーする
+        self._stack_copies = []
+        for _, x, y, w, h, r, sw, sh in layout:
+            if r is None:
+                continue
+            dst = self._stack_bgr[r:r+sh, :sw]
+            resize = (sw, sh) != (w, h)
+            buf = None
+            if resize and not dst.flags.c_contiguous:
+                buf = np.empty((sh, sw, 3), dtype=np.uint8)
+            self._stack_copies.append((x, y, w, h, dst, resize, buf))
+        self._stack_pad = cv2.bitwise_not(valid)
+        # 微小ROI（形態学的処理を省略する領域）の位置（255）を表すマスク（該当ROIがなければNone）
+        raw = np.zeros_like(valid)
+        for *_, r, sw, sh in layout:
+            if r is not None and sw * sh < self._morph_skip_px:
+                raw[r:r+sh, :sw] = 255
+        self._stack_raw = raw if raw.any() else None
+        if self._use_opencl:
+            # 毎フレーム転送しないよう、余白マスクはデバイス側に置いておく
+            self._stack_valid = cv2.UMat(self._stack_valid)
+            self._stack_pad = cv2.UMat(self._stack_pad)
+            if self._stack_raw is not None:
+                self._stack_raw = cv2.UMat(self._stack_raw)
+        # ROIごとの行範囲と幅（画素数の集計用）
+        self._stack_slices = [(r, r + sh, sw) for *_, r, sw, sh in layout if r is not None]
     
-    def analyze_color(self, roi: np.ndarray) -> Tuple[str, float]:
-        """ROI内の色を分析してランプ状態を判定"""
-        if roi is None or roi.size == 0:
-            return "UNKNOWN", 0.0
+    def extract_rois_batched(self, frame: np.ndarray) -> Tuple[np.ndarray, List[Tuple[int, Optional[int]]]]:
+        """全ROIを1枚の画像に詰めて返す（戻り値: 積み重ね画像, (ランプID, 先頭行) の対応表）
         
-        # HSVに変換
-        hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
+        先頭行がNoneのランプは空のROI
+        """
+        if frame.shape[:2] != self._stack_shape:
+            self._build_roi_stack(frame.shape)
         
-        # 明度フィルタ
-        min_brightness = self.logic_config["min_brightness_v"]
-        bright_mask = hsv[:, :, 2] >= min_brightness
+        for x, y, w, h, dst, resize, buf in self._stack_copies:
+            roi = frame[y:y+h, x:x+w]
+            if not resize:
+                dst[...] = roi
+            elif buf is None:
+                # 面積平均で縮小し、支配的な色の比率を保つ
+                cv2.resize(roi, dst.shape[1::-1], dst=dst, interpolation=cv2.INTER_AREA)
+            else:
+                cv2.resize(roi, buf.shape[1::-1], dst=buf, interpolation=cv2.INTER_AREA)
+                dst[...] = buf
         
-        if not np.any(bright_mask):
-            return "UNKNOWN", 0.0
+        return self._stack_bgr, [(lamp_id, row) for lamp_id, _, _, _, _, row, _, _ in self._stack_layout]
+    
+    def open_stack_mask(self, mask: np.ndarray) -> np.ndarray:
+        """積み重ねたマスクにROI単位のオープニングを適用（微小ROIでは省略）
         
-        # 赤色判定
-        red_ratio = self.calculate_red_ratio(hsv, bright_mask)
-        if red_ratio >= self.logic_config["red_ratio_thresh"]:
-            return "RED", red_ratio
+        収縮時は余白を255、膨張時は0にしておくことで、ROIごとに
+        cv2.morphologyEx(MORPH_OPEN) を行った場合と同じ結果になる
+        （反復する場合は1回ごとに余白を戻す）
+        入力と同じ型（ndarray / UMat）で返す
+        """
+        opened = mask
+        for _ in range(self._morph_iterations):
+            cv2.bitwise_or(opened, self._stack_pad, dst=opened)
+            opened = cv2.erode(opened, self._morph_kernel)
+        for _ in range(self._morph_iterations):
+            cv2.bitwise_and(opened, self._stack_valid, dst=opened)
+            opened = cv2.dilate(opened, self._morph_kernel)
         
-        # 緑色判定
-        green_ratio = self.calculate_green_ratio(hsv, bright_mask)
-        if green_ratio >= self.logic_config["green_ratio_thresh"]:
-            return "GREEN", green_ratio
+        # 微小ROIは処理前のマスクに戻す
+        if self._stack_raw is not None:
+            opened = cv2.copyTo(mask, self._stack_raw, opened)
         
-        return "UNKNOWN", 0.0
+        return opened
     
-    def calculate_red_ratio(self, hsv: np.ndarray, bright_mask: np.ndarray) -> float:
-        """赤色の面積比を計算（元のロジックベース）"""
-        red_hue_ranges = self.logic_config["red_hue_range"]
-        red_sat_min = self.logic_config["red_sat_min"]
-        red_val_min = self.logic_config["red_val_min"]
+    def count_per_roi(self, mask: np.ndarray) -> List[int]:
+        """積み重ねたマスク（uint8）のROIごとの非ゼロ画素数を返す"""
+        if isinstance(mask, cv2.UMat):
+            # ROI単位の集計はCPU側で行う
+            mask = mask.get()
+        return [cv2.countNonZero(mask[row_start:row_end, :w]) for row_start, row_end, w in self._stack_slices]
+    
+    def ratio_hits(self, counts: List[int], totals: List[int], thresh: float) -> List[bool]:
+        """ROIごとに 画素数 / 明るい画素数 がしきい値以上かどうかを返す"""
+        return [total > 0 and count / total >= thresh for count, total in zip(counts, totals)]
+    
+    def stack_changed(self, stack: np.ndarray) -> bool:
+        """前回解析した積み重ね画像から、いずれかの画素が change_threshold 以上変化したかを返す（変化検知用）
         
-        red_mask = np.zeros(hsv.shape[:2], dtype=bool)
+        ROI全体の平均では小さなランプの色の切り替わりが埋もれるため、画素単位の最大差で判定する
+        """
+        if self._last_stack is None or self._last_stack.shape != stack.shape:
+            self._last_stack = stack.copy()
+            self._stack_diff = np.empty_like(stack)
+            return True
+        cv2.absdiff(stack, self._last_stack, dst=self._stack_diff)
+        if self._stack_diff.max() < self._change_thresh:
+            return False
+        np.copyto(self._last_stack, stack)
+        return True
+    
+    def analyze_frame(self, frame: np.ndarray) -> List[Tuple[int, int, float]]:
+        """フレーム内の全ランプを一括で解析して (ランプID, 状態コード, 信頼度) のリストを返す
         
-        # 赤色相は0-10と170-180の2つの範囲
-        for hue_range in red_hue_ranges:
-            hue_min, hue_max = hue_range
-            hue_mask = (hsv[:, :, 0] >= hue_min) & (hsv[:, :, 0] <= hue_max)
-            sat_mask = hsv[:, :, 1] >= red_sat_min
-            val_mask = hsv[:, :, 2] >= red_val_min
-            
-            red_mask |= hue_mask & sat_mask & val_mask
+        全ROIを1枚の画像に積み重ね、HSV変換・色判定・ノイズ除去を1回ずつで済ませる。
+        前回解析時からどのROI画素もほとんど変わっていなければ前回の結果を返す
+        """
+        stack, index_map = self.extract_rois_batched(frame)
+        if not self._stack_slices:
+            return [(lamp_id, STATE_UNKNOWN, 0.0) for lamp_id, _ in index_map]
         
-        red_mask &= bright_mask
+        # 変化検知（比較対象は前回「解析した」時点の値なので、ゆっくりした変化も蓄積して検出される）
+        if self._change_thresh > 0 and not self.stack_changed(stack):
+            return self._last_results
         
-        # 形態学的処理でノイズ除去
-        kernel_size = self.logic_config["morphological_kernel"]
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
-        red_mask = cv2.morphologyEx(red_mask.astype(np.uint8), cv2.MORPH_OPEN, kernel)
+        # OpenCL使用時は積み重ね画像を1回だけ転送し、以降の処理をデバイス上で行う
+        if self._use_opencl:
+            stack = cv2.UMat(stack)
         
-        total_pixels = np.sum(bright_mask)
-        red_pixels = np.sum(red_mask)
+        # HSVに変換
+        hsv = cv2.cvtColor(stack, cv2.COLOR_BGR2HSV)
         
-        return red_pixels / total_pixels if total_pixels > 0 else 0.0
-    
-    def calculate_green_ratio(self, hsv: np.ndarray, bright_mask: np.ndarray) -> float:
-        """緑色の面積比を計算"""
-        green_hue_range = self.logic_config["green_hue_range"]
-        green_sat_min = self.logic_config["green_sat_min"]
-        green_val_min = self.logic_config["green_val_min"]
+        # 明度フィルタ（余白は集計時にROI単位で切り出すため除外不要）
+        bright_mask = cv2.inRange(hsv, self._bright_lower, self._bright_upper)
+        bright_counts = self.count_per_roi(bright_mask)
         
-        hue_min, hue_max = green_hue_range
-        hue_mask = (hsv[:, :, 0] >= hue_min) & (hsv[:, :, 0] <= hue_max)
-        sat_mask = hsv[:, :, 1] >= green_sat_min
-        val_mask = hsv[:, :, 2] >= green_val_min
+        # どのROIにも明るい画素がなければ色判定は不要（全ランプUNKNOWN）
+        if not any(bright_counts):
+            self._last_results = [(lamp_id, STATE_UNKNOWN, 0.0) for lamp_id, _ in index_map]
+            return self._last_results
+        
+        # 赤色相は0-10と170-180の2つの範囲
+        (lower, upper), *other_bounds = self._red_bounds
+        red_mask = cv2.inRange(hsv, lower, upper)
+        for lower, upper in other_bounds:
+            cv2.bitwise_or(red_mask, cv2.inRange(hsv, lower, upper), dst=red_mask)
         
-        green_mask = hue_mask & sat_mask & val_mask & bright_mask
+        green_mask = cv2.inRange(hsv, self._green_lower, self._green_upper)
         
         # 形態学的処理でノイズ除去
-        kernel_size = self.logic_config["morphological_kernel"]
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
-        green_mask = cv2.morphologyEx(green_mask.astype(np.uint8), cv2.MORPH_OPEN, kernel)
+        # オープニングは画素を増やさないため、処理前の比率が全ROIでしきい値未満なら
+        # 処理後も判定は変わらない。その場合は形態学的処理を省略する
+        red_counts = self.count_per_roi(red_mask)
+        if any(self.ratio_hits(red_counts, bright_counts, self._red_thresh)):
+            red_counts = self.count_per_roi(self.open_stack_mask(red_mask))
+        red_hits = self.ratio_hits(red_counts, bright_counts, self._red_thresh)
+        
+        # 緑は赤と判定されなかったROIだけが判定対象
+        green_counts = self.count_per_roi(green_mask)
+        green_hits = self.ratio_hits(green_counts, bright_counts, self._green_thresh)
+        if any(green_hit and not red_hit for red_hit, green_hit in zip(red_hits, green_hits)):
+            green_counts = self.count_per_roi(self.open_stack_mask(green_mask))
         
-        total_pixels = np.sum(bright_mask)
-        green_pixels = np.sum(green_mask)
+        results = []
+        index = 0
+        for lamp_id, row in index_map:
+            if row is None:
+                results.append((lamp_id, STATE_UNKNOWN, 0.0))
+                continue
+            
+            total_pixels = bright_counts[index]
+            red_pixels = red_counts[index]
+            green_pixels = green_counts[index]
+            index += 1
+            
+            if total_pixels == 0:
+                results.append((lamp_id, STATE_UNKNOWN, 0.0))
+                continue
+            
+            # 赤色判定
+            red_ratio = red_pixels / total_pixels
+            if red_ratio >= self._red_thresh:
+                results.append((lamp_id, STATE_RED, red_ratio))
+                continue
+            
+            # 緑色判定
+            green_ratio = green_pixels / total_pixels
+            if green_ratio >= self._green_thresh:
+                results.append((lamp_id, STATE_GREEN, green_ratio))
+            else:
+                results.append((lamp_id, STATE_UNKNOWN, 0.0))
         
-        return green_pixels / total_pixels if total_pixels > 0 else 0.0
+        self._last_results = results
+        return results
     
-    def update_lamp_status(self, lamp_id: int, state: str, confidence: float):
+    def update_lamp_status(self, lamp_id: int, code: int, confidence: float):
         """ランプ状態を更新（多数決フィルタ適用）- 誤検知対策強化版"""
         # 遅延初期化
         self._lazy_init()
         
-        # 履歴に追加
-        self.lamp_history[lamp_id].append((state, confidence))
+        row = lamp_id - 1
+        state_count = self._state_count[row]
+        conf_sum = self._conf_sum[row]
+        
+        # 窓が埋まっていれば追い出される最古の要素の寄与を差し引く
+        pos = self._ring_pos[row]
+        conf_fixed = int(round(confidence * CONF_SCALE))
+        if self._ring_len[row] >= self._frames_window:
+            old_code = int(self._state_ring[row, pos])
+            old_conf = int(self._conf_ring[row, pos])
+            # 追い出す要素と同じ値が入るだけなら集計も判定結果も前回のまま（状態が続く間の大半のフレーム）
+            if old_code == code and old_conf == conf_fixed:
+                self._ring_pos[row] = (pos + 1) % self._frames_window
+                return
+            state_count[old_code] -= 1
+            conf_sum[old_code] -= old_conf
+        else:
+            self._ring_len[row] += 1
+        
+        # 履歴に追加（最古の要素を上書き）
+        self._state_ring[row, pos] = code
+        self._conf_ring[row, pos] = conf_fixed
+        state_count[code] += 1
+        conf_sum[code] += conf_fixed
+        self._ring_pos[row] = (pos + 1) % self._frames_window
         
-        # 多数決で最終状態を決定
-        if len(self.lamp_history[lamp_id]) >= self.logic_config["frames_window"]:
-            states = [item[0] for item in self.lamp_history[lamp_id]]
-            state_counts = {s: states.count(s) for s in set(states)}
-            final_state = max(state_counts, key=state_counts.get)
+        # 多数決で最終状態を決定（同数の場合はコードの小さい状態を優先）
+        if self._ring_len[row] >= self._frames_window:
+            final_code = max(range(len(STATE_NAMES)), key=state_count.__getitem__)
             
             # 誤検知対策1: 多数決の閾値チェック
-            total_frames = len(self.lamp_history[lamp_id])
-            majority_count = state_counts[final_state]
-            majority_ratio = majority_count / total_frames
+            majority_count = state_count[final_code]
+            majority_ratio = majority_count / self._frames_window
             
             # 過半数を超えない場合はUNKNOWNとする
             if majority_ratio < 0.6:  # 60%以上の合意が必要
-                final_state = "UNKNOWN"
+                final_state = STATE_UNKNOWN
                 final_confidence = 0.0
             else:
                 # 信頼度は平均値
-                confidences = [item[1] for item in self.lamp_history[lamp_id] if item[0] == final_state]
-                final_confidence = np.mean(confidences) if confidences else 0.0
+                final_state = final_code
+                final_confidence = conf_sum[final_code] / (majority_count * CONF_SCALE)
                 
                 # 誤検知対策2: 信頼度の最小閾値チェック
                 min_confidence_thresh = 0.4  # 最小信頼度閾値
                 if final_confidence < min_confidence_thresh:
-                    final_state = "UNKNOWN"
+                    final_state = STATE_UNKNOWN
                     final_confidence = 0.0
             
             # 状態が変化した場合のみ更新
-            if self.lamp_statuses[lamp_id].state != final_state:
-                old_state = self.lamp_statuses[lamp_id].state
-                self.lamp_statuses[lamp_id].state = final_state
-                self.lamp_statuses[lamp_id].confidence = final_confidence
+            old_state = int(self.lamp_states[row])
+            if old_state != final_state:
+                self.lamp_states[row] = final_state
+                self.lamp_confidences[row] = final_confidence
+                self._overlay_dirty = True
                 
-                print(f"ランプ {lamp_id}: {old_state} → {final_state} (信頼度: {final_confidence:.2f}, 合意率: {majority_ratio:.2f})")
+                print(f"ランプ {lamp_id}: {STATE_NAMES[old_state]} → {STATE_NAMES[final_state]} (信頼度: {final_confidence:.2f}, 合意率: {majority_ratio:.2f})")
                 
                 # 赤色検出時はバッチ通知に追加
-                if final_state == "RED":
-                    self.add_to_batch_notification(lamp_id, final_state, final_confidence)
+                if final_state == STATE_RED:
+                    self.add_to_batch_notification(lamp_id, STATE_NAMES[final_state], final_confidence)
     
     def send_notification(self, lamp_id: int, state: str, confidence: float):
         """Cloudflare Workersに通知を送信"""
         current_time = time.time()
-        last_notification = self.lamp_statuses[lamp_id].last_notification
+        last_notification = float(self.last_notifications[lamp_id - 1])
         min_interval = self.notify_config["min_interval_sec"]
         
         # 通知間隔チェック
@@ -260,42 +538,12 @@ class LampDetector:
             "message": f"ランプ {lamp_id} が {state} 状態になりました",
         }
 
-        # 署名を生成
-        signature = self.create_signature(notification_data)
-    
-        # ヘッダーに署名を追加
-        headers = {
-            "Content-Type": "application/json",
-            "X-Signature-256": signature
-        }
-        
-        try:
-            request_url = self.notify_config["worker_url"]
-            data_payload = json.dumps(notification_data, sort_keys=True)
-            
-            print(f"通知送信先URL: {request_url}")
-            print(f"通知データ: {data_payload}")
-
-            response = requests.post(
-                request_url,
-                data=data_payload.encode('utf-8'),
-                headers=headers,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                print(f"ランプ {lamp_id}: 通知送信成功")
-                self.lamp_statuses[lamp_id].last_notification = current_time
-            else:
-                print(f"ランプ {lamp_id}: 通知送信失敗 (HTTP {response.status_code}) - {response.text}")
-                
-        except requests.RequestException as e:
-            print(f"ランプ {lamp_id}: 通知送信エラー - {e}")
+        self.enqueue_notification(notification_data, [lamp_id], current_time)
     
     def add_to_batch_notification(self, lamp_id: int, state: str, confidence: float):
         """バッチ通知に追加（改善版：すべてのランプをまとめて通知）"""
         current_time = time.time()
-        last_notification = self.lamp_statuses[lamp_id].last_notification
+        last_notification = float(self.last_notifications[lamp_id - 1])
         min_interval = self.notify_config["min_interval_sec"]
         
         # 通知間隔チェック
@@ -386,90 +634,122 @@ class LampDetector:
             "lamp_ids": lamp_ids  # ソート済みのリスト
         }
         
-        # 署名を生成
-        signature = self.create_signature(notification_data)
+        print(f"バッチ通知送信: {len(self.pending_notifications)}個のランプ")
+        self.enqueue_notification(notification_data, [n["lamp_id"] for n in self.pending_notifications], current_time)
+        
+        # バッチをクリア
+        self.pending_notifications.clear()
+        self.last_batch_notification = current_time
+    
+    def enqueue_notification(self, notification_data: Dict, lamp_ids: List[int], current_time: float):
+        """通知データを送信キューに登録（送信はワーカースレッドが行う）"""
+        try:
+            self._notify_queue.put_nowait((notification_data, lamp_ids, current_time))
+        except queue.Full:
+            print(f"通知キューが満杯のため破棄しました: ランプ {lamp_ids}")
+            return
+        
+        # 送信完了を待たずに通知間隔を開始し、送信中に同じ通知が重ねて登録されないようにする
+        # （送信に失敗した場合はワーカースレッドが元に戻す）
+        self.last_notifications[[lamp_id - 1 for lamp_id in lamp_ids]] = current_time
+    
+    def _notify_worker(self):
+        """通知キューを消費してCloudflare Workersへ送信（ワーカースレッド）"""
+        while True:
+            notification_data, lamp_ids, current_time = self._notify_queue.get()
+            try:
+                self._post_notification(notification_data, lamp_ids, current_time)
+            finally:
+                self._notify_queue.task_done()
+    
+    def _post_notification(self, notification_data: Dict, lamp_ids: List[int], current_time: float):
+        """通知データをHMAC署名付きでPOSTし、失敗したランプの通知間隔を解除"""
+        # ペイロードは1回だけシリアライズし、同じバイト列で署名・送信する
+        data_payload = json.dumps(notification_data, sort_keys=True)
+        payload_bytes = data_payload.encode('utf-8')
         
         # ヘッダーに署名を追加
         headers = {
             "Content-Type": "application/json",
-            "X-Signature-256": signature
+            "X-Signature-256": self.create_signature(payload_bytes)
         }
         
         try:
             request_url = self.notify_config["worker_url"]
-            data_payload = json.dumps(notification_data, sort_keys=True)
             
-            print(f"バッチ通知送信: {len(self.pending_notifications)}個のランプ")
+            print(f"通知送信先URL: {request_url}")
             print(f"通知データ: {data_payload}")
             
-            response = requests.post(
+            response = self._session.post(
                 request_url,
-                data=data_payload.encode('utf-8'),
+                data=payload_bytes,
                 headers=headers,
                 timeout=10
             )
             
             if response.status_code == 200:
-                print(f"バッチ通知送信成功: ランプ {[n['lamp_id'] for n in self.pending_notifications]}")
-                # 通知済みランプの最終通知時刻を更新
-                for notification in self.pending_notifications:
-                    self.lamp_statuses[notification["lamp_id"]].last_notification = current_time
-            else:
-                print(f"バッチ通知送信失敗 (HTTP {response.status_code}) - {response.text}")
+                print(f"通知送信成功: ランプ {lamp_ids}")
+                return
+            print(f"通知送信失敗: ランプ {lamp_ids} (HTTP {response.status_code}) - {response.text}")
                 
         except requests.RequestException as e:
-            print(f"バッチ通知送信エラー - {e}")
-        finally:
-            # バッチをクリア
-            self.pending_notifications.clear()
-            self.last_batch_notification = current_time
-    
-    def create_signature(self, data: Dict) -> str:
-        """HMAC署名を作成"""
-        secret = self.notify_config["secret"].encode('utf-8')
-        message = json.dumps(data, sort_keys=True).encode('utf-8')
-        signature = hmac.new(secret, message, hashlib.sha256).hexdigest()
+            print(f"通知送信エラー: ランプ {lamp_ids} - {e}")
+        
+        # 送信できなかったランプは次の検出で再通知できるよう通知間隔を解除する
+        # （その後に新しい通知が登録されていれば、そちらの時刻を残す）
+        for lamp_id in lamp_ids:
+            if self.last_notifications[lamp_id - 1] == current_time:
+                self.last_notifications[lamp_id - 1] = 0.0
+    
+    def create_signature(self, payload_bytes: bytes) -> str:
+        """HMAC署名を作成（requestsで送るペイロードと完全に同じバイト列から生成）"""
+        # hmac.digest はHMACオブジェクトを作らずにC実装で一括計算する
+        signature = hmac.digest(self._secret, payload_bytes, "sha256").hex()
         return f"sha256={signature}"
     
     def process_frame(self, frame: np.ndarray):
         """フレームを処理してランプ状態を判定"""
-        for lamp_id in range(1, 13):
-            roi = self.extract_roi(frame, lamp_id)
-            if roi is not None:
-                state, confidence = self.analyze_color(roi)
-                self.update_lamp_status(lamp_id, state, confidence)
+        for lamp_id, state, confidence in self.analyze_frame(frame):
+            self.update_lamp_status(lamp_id, state, confidence)
     
     def draw_debug_overlay(self, frame: np.ndarray) -> np.ndarray:
-        """デバッグ用のオーバーレイを描画"""
+        """デバッグ用のオーバーレイを描画
+        
+        元フレームはフレーム保存に使うため書き換えず、使い回しのバッファに描画して返す
+        （戻り値は次の呼び出しで上書きされる）
+        """
         # 遅延初期化
         self._lazy_init()
         
-        overlay_frame = frame.copy()
+        if self._overlay_buf is None or self._overlay_buf.shape != frame.shape:
+            self._overlay_buf = np.empty_like(frame)
         
-        # ROI矩形を描画
-        for lamp_id in range(1, 13):
-            roi_key = f"lamp_{lamp_id}"
-            if roi_key in self.rois:
-                x, y, w, h = self.rois[roi_key]
-                
-                # ランプ状態に応じて色を変更
-                status = self.lamp_statuses[lamp_id]
-                if status.state == "RED":
-                    color = (0, 0, 255)  # 赤
-                elif status.state == "GREEN":
-                    color = (0, 255, 0)  # 緑
-                else:
-                    color = (128, 128, 128)  # 灰色
-                
-                # ROI矩形を描画
-                cv2.rectangle(overlay_frame, (x, y), (x + w, y + h), color, 2)
-                
-                # ランプ番号と状態を描画
-                text = f"L{lamp_id}: {status.state}"
-                cv2.putText(overlay_frame, text, (x, y - 5), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+        if self._overlay_dirty:
+            self.build_overlay_draw_cache()
+        
+        # 文字のアンチエイリアスは下地の画素と合成されるため、図形は毎回フレームに描く
+        np.copyto(self._overlay_buf, frame)
+        for pt1, pt2, text, org, color in self._overlay_draw_cache:
+            # ROI矩形を描画
+            cv2.rectangle(self._overlay_buf, pt1, pt2, color, 2)
+            
+            # ランプ番号と状態を描画
+            cv2.putText(self._overlay_buf, text, org, 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
         
-        return overlay_frame
+        return self._overlay_buf
+    
+    def build_overlay_draw_cache(self):
+        """ROI枠とランプ状態の描画内容（矩形の頂点・文字列・文字位置・色）を作り直す"""
+        cache = []
+        for lamp_id, x, y, w, h in self._roi_bounds:
+            # ランプ状態に応じて色を変更
+            state = self.lamp_states[lamp_id - 1]
+            cache.append(((x, y), (x + w, y + h), f"L{lamp_id}: {STATE_NAMES[state]}", (x, y - 5),
+                          STATE_COLORS[state]))
+        
+        self._overlay_draw_cache = cache
+        self._overlay_dirty = False
 
 class WebcamMonitorFast:
     """Webカメラ監視システム（高速化版）"""
@@ -485,9 +765,27 @@ class WebcamMonitorFast:
         self.cap = None
         self.running = False
         
+        # キャプチャスレッドから受け取る最新フレーム（古いフレームは破棄して常に1枚だけ保持）
+        self._frame_q = queue.Queue(maxsize=1)
+        self._stop_event = threading.Event()
+        self._capture_thread = None
+        
         # カメラ設定
         self.camera_config = self.config["camera"]
         
+        # 画面表示の設定（表示はNフレームに1回、headlessでは画面を使わない）
+        monitor_config = self.config.get("monitor", {})
+        self.display_every_n = max(1, int(monitor_config.get("display_every_n", 1)))
+        # ランプ判定もNフレームに1回だけ（表示・キー入力・バッチ通知のチェックは毎フレーム続ける）
+        self.analyze_every_n = max(1, int(monitor_config.get("analyze_every_n", 1)))
+        self.headless = bool(monitor_config.get("headless", False))
+        
+        # OpenCVの内部スレッド数（解析対象は縮小済みの小さなROIだけなので、スレッド分割の
+        # オーバーヘッドの方が大きい。キャプチャ・通知スレッドとのCPUの奪い合いも避ける。0でOpenCVの既定値）
+        opencv_threads = int(monitor_config.get("opencv_threads", 1))
+        if opencv_threads > 0:
+            cv2.setNumThreads(opencv_threads)
+        
         print("初期化完了")
     
     def load_env_file(self, env_path: str = ".env"):
@@ -557,7 +855,7 @@ class WebcamMonitorFast:
             self.load_env_file()
             
             with open(config_path, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
+                config = yaml.load(f, Loader=YAML_LOADER)
                 # 環境変数を展開
                 config = self.expand_environment_variables(config)
                 return config
@@ -625,6 +923,29 @@ class WebcamMonitorFast:
             self.cap.release()
             self.cap = None
     
+    def _put_latest_frame(self, frame: Optional[np.ndarray]):
+        """フレームキューに投入（満杯なら最も古いフレームを捨てて入れ替える）"""
+        try:
+            self._frame_q.put_nowait(frame)
+        except queue.Full:
+            try:
+                self._frame_q.get_nowait()
+            except queue.Empty:
+                pass
+            self._frame_q.put_nowait(frame)
+    
+    def _capture_loop(self):
+        """カメラからフレームを読み続けるキャプチャスレッド"""
+        while not self._stop_event.is_set():
+            ret, frame = self.cap.read()
+            
+            if not ret:
+                print("フレームの取得に失敗しました")
+                self._put_latest_frame(None)  # 終了をメインループへ通知
+                break
+            
+            self._put_latest_frame(frame)
+    
     def run(self):
         """監視システムを実行"""
         print("Webカメラ監視システム（高速化版）を開始します")
@@ -637,73 +958,50 @@ class WebcamMonitorFast:
         frame_count = 0
         start_time = time.time()
         
-        # ウィンドウ作成
-        cv2.namedWindow("Webcam Monitor (Fast)", cv2.WINDOW_AUTOSIZE)
+        # ウィンドウ作成（headlessでは作らず、終了はCtrl+Cで行う）
+        if self.headless:
+            print("headlessモード: 画面表示なしで監視します（Ctrl+Cで終了）")
+        else:
+            cv2.namedWindow("Webcam Monitor (Fast)", cv2.WINDOW_AUTOSIZE)
+        
+        # キャプチャは別スレッドで行い、処理の遅れでカメラのバッファに古いフレームが溜まらないようにする
+        self._stop_event.clear()
+        self._capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._capture_thread.start()
         
         try:
             while self.running:
-                ret, frame = self.cap.read()
+                try:
+                    frame = self._frame_q.get(timeout=1.0)
+                except queue.Empty:
+                    continue
                 
-                if not ret:
-                    print("フレームの取得に失敗しました")
+                if frame is None:
                     break
                 
-                # フレーム処理
-                self.detector.process_frame(frame)
+                # フレーム処理（判定はNフレームに1回）
+                if frame_count % self.analyze_every_n == 0:
+                    self.detector.process_frame(frame)
                 
                 # バッチ通知の定期チェック（画面フリーズ対策）
                 self.detector.check_and_send_batch_notification()
                 
-                # デバッグ用オーバーレイを描画
-                display_frame = self.detector.draw_debug_overlay(frame)
-                
-                # フレーム情報を描画
                 frame_count += 1
                 elapsed_time = time.time() - start_time
                 current_fps = frame_count / elapsed_time if elapsed_time > 0 else 0
                 
-                info_text = f"Frame: {frame_count}, FPS: {current_fps:.1f} [FAST MODE]"
-                cv2.putText(display_frame, info_text, (10, 30), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-                
-                # 操作説明を描画
-                instructions = [
-                    "Press 'q' or ESC to quit",
-                    "Press 's' to save current frame",
-                    "Press 'r' to reset lamp history",
-                    "Click X button to close window"
-                ]
-                
-                for i, instruction in enumerate(instructions):
-                    y_pos = display_frame.shape[0] - 60 + i * 20
-                    cv2.putText(display_frame, instruction, (10, y_pos), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-                
-                # フレーム表示
-                try:
-                    cv2.imshow("Webcam Monitor (Fast)", display_frame)
-                except cv2.error:
-                    print("ウィンドウが閉じられました")
-                    break
-                
-                # キー入力処理
-                key = cv2.waitKey(1) & 0xFF
-                
-                # ウィンドウの状態をチェック
-                try:
-                    if cv2.getWindowProperty("Webcam Monitor (Fast)", cv2.WND_PROP_VISIBLE) < 1:
-                        print("ウィンドウが閉じられました")
+                # 画面表示とキー入力はNフレームに1回だけ（waitKeyの待ち時間で処理が律速されないように）
+                if not self.headless and frame_count % self.display_every_n == 0:
+                    key = self.show_frame(frame, frame_count, current_fps)
+                    if key is None:
                         break
-                except:
-                    print("ウィンドウが閉じられました")
-                    break
-                
-                if key == ord('q') or key == 27:
-                    break
-                elif key == ord('s'):
-                    self.save_frame(frame, frame_count)
-                elif key == ord('r'):
-                    self.reset_lamp_history()
+                    
+                    if key == ord('q') or key == 27:
+                        break
+                    elif key == ord('s'):
+                        self.save_frame(frame, frame_count)
+                    elif key == ord('r'):
+                        self.reset_lamp_history()
                 
                 # 統計情報出力（頻度を下げて高速化）
                 if frame_count % 200 == 0:
@@ -714,10 +1012,64 @@ class WebcamMonitorFast:
             print("\nキーボード割り込みで終了します")
         finally:
             self.running = False
+            self._stop_event.set()
+            capture_running = False
+            if self._capture_thread is not None:
+                self._capture_thread.join(timeout=2.0)
+                # read() から戻らないスレッドがあるうちにカメラを解放すると競合するため、解放はプロセス終了に任せる
+                capture_running = self._capture_thread.is_alive()
+                self._capture_thread = None
             cv2.destroyAllWindows()
-            self.release_camera()
+            if capture_running:
+                print("キャプチャスレッドが終了しないため、カメラの解放を省略します")
+            else:
+                self.release_camera()
             print("Webカメラ監視システム（高速化版）を終了しました")
     
+    def show_frame(self, frame: np.ndarray, frame_count: int, current_fps: float) -> Optional[int]:
+        """オーバーレイ付きでフレームを表示し、押されたキーを返す（ウィンドウが閉じられた場合はNone）"""
+        # デバッグ用オーバーレイを描画
+        display_frame = self.detector.draw_debug_overlay(frame)
+        
+        # フレーム情報を描画
+        info_text = f"Frame: {frame_count}, FPS: {current_fps:.1f} [FAST MODE]"
+        cv2.putText(display_frame, info_text, (10, 30), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+        
+        # 操作説明を描画
+        instructions = [
+            "Press 'q' or ESC to quit",
+            "Press 's' to save current frame",
+            "Press 'r' to reset lamp history",
+            "Click X button to close window"
+        ]
+        
+        for i, instruction in enumerate(instructions):
+            y_pos = display_frame.shape[0] - 60 + i * 20
+            cv2.putText(display_frame, instruction, (10, y_pos), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        
+        # フレーム表示
+        try:
+            cv2.imshow("Webcam Monitor (Fast)", display_frame)
+        except cv2.error:
+            print("ウィンドウが閉じられました")
+            return None
+        
+        # キー入力処理
+        key = cv2.waitKey(1) & 0xFF
+        
+        # ウィンドウの状態をチェック
+        try:
+            if cv2.getWindowProperty("Webcam Monitor (Fast)", cv2.WND_PROP_VISIBLE) < 1:
+                print("ウィンドウが閉じられました")
+                return None
+        except:
+            print("ウィンドウが閉じられました")
+            return None
+        
+        return key
+    
     def save_frame(self, frame: np.ndarray, frame_count: int):
         """現在のフレームを保存"""
         timestamp = time.strftime("%Y%m%d_%H%M%S")
@@ -728,10 +1080,10 @@ class WebcamMonitorFast:
     def reset_lamp_history(self):
         """ランプ履歴をリセット"""
         if self.detector._initialized:
-            for lamp_id in range(1, 13):
-                self.detector.lamp_history[lamp_id].clear()
-                self.detector.lamp_statuses[lamp_id].state = "UNKNOWN"
-                self.detector.lamp_statuses[lamp_id].confidence = 0.0
+            self.detector.reset_history()
+            self.detector.lamp_states.fill(STATE_UNKNOWN)
+            self.detector.lamp_confidences.fill(0.0)
+            self.detector._overlay_dirty = True
             print("ランプ履歴をリセットしました")
         else:
             print("まだ初期化されていません")
@@ -743,9 +1095,9 @@ class WebcamMonitorFast:
             return
             
         print("\n=== 現在のランプ状態 ===")
-        for lamp_id in range(1, 13):
-            status = self.detector.lamp_statuses[lamp_id]
-            print(f"ランプ {lamp_id:2d}: {status.state:7s} (信頼度: {status.confidence:.2f})")
+        for lamp_id, state, confidence in zip(range(1, 13), self.detector.lamp_states.tolist(),
+                                              self.detector.lamp_confidences.tolist()):
+            print(f"ランプ {lamp_id:2d}: {STATE_NAMES[state]:7s} (信頼度: {confidence:.2f})")
         print("========================\n")
 
 def main():
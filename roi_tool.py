@@ -22,8 +22,8 @@ ROI設定ツール（Webカメラ用）
 - ウィンドウ × : 終了
 
 ■ 前提設定（config.yaml 例）
-- camera.device_id, camera.size([width, height]), camera.fps
-  ※ WindowsはCAP_DSHOW, Raspberry Pi/LinuxはCAP_V4L2が安定しやすい
+- camera.device_id, camera.size([width, height]), camera.fps, camera.fourcc（既定 MJPG）
+  ※ WindowsはCAP_DSHOW, Raspberry Pi/LinuxはCAP_V4L2が安定しやすいため、OSに応じて自動で選択
 - 既存の rois.lamp_1..lamp_12 があれば読み込んで編集可能
 
 ■ ヒント
@@ -35,8 +35,25 @@ ROI設定ツール（Webカメラ用）
 import cv2
 import numpy as np
 import yaml
+import os
+import sys
+import queue
+import threading
 from typing import Dict, List, Tuple, Optional
 
+from utils.yaml_cache import load_yaml_cached
+
+# YAMLの書き出しにはlibyamlのC実装を優先して使う（未ビルド環境では純Python版）
+YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# OSごとに安定しやすいキャプチャバックエンド（開けない場合はOpenCVの既定を試す）
+if sys.platform.startswith("win"):
+    CAPTURE_BACKEND = cv2.CAP_DSHOW
+elif sys.platform == "darwin":
+    CAPTURE_BACKEND = cv2.CAP_AVFOUNDATION
+else:
+    CAPTURE_BACKEND = cv2.CAP_V4L2
+
 class ROITool:
     """ROI設定ツール"""
     
@@ -53,6 +70,24 @@ class ROITool:
         self.end_point = None
         self.temp_rect = None
         
+        # キャプチャスレッドから受け取る最新フレーム（古いフレームは破棄して常に1枚だけ保持）
+        self._frame_q = queue.Queue(maxsize=1)
+        self._stop_event = threading.Event()
+        self._capture_thread = None
+        
+        # オーバーレイ描画用のバッファ（フレームサイズが変わったときだけ確保し直す）
+        self._overlay_buf = None
+        # ROI枠の描画用データ (lamp_id, 左上, 右下, ラベル, ラベル位置)（ROIが変わったらNoneにして作り直す）
+        self._roi_draw_cache = None
+        
+        # キー入力と処理の対応表
+        self._key_handlers = {
+            ord('n'): self.next_lamp,
+            ord('p'): self.prev_lamp,
+            ord('d'): self.delete_current_roi,
+            ord('s'): self.save_config_from_key,
+        }
+        
         # 既存のROI設定を読み込み
         if "rois" in self.config:
             for key, value in self.config["rois"].items():
@@ -60,14 +95,16 @@ class ROITool:
                     lamp_id = int(key.split("_")[1])
                     self.rois[lamp_id] = value
         
+        # 最後に保存（読み込み）した時点のROI設定（変更がなければ保存を省略する）
+        self._saved_rois = self.snapshot_rois()
+        
         print("ROI設定ツールを初期化しました")
         print(f"現在のランプID: {self.current_lamp_id}")
     
     def load_config(self) -> Dict:
         """設定ファイルを読み込み"""
         try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f)
+            return load_yaml_cached(self.config_path)
         except FileNotFoundError:
             print(f"設定ファイル {self.config_path} が見つかりません")
             return {}
@@ -75,8 +112,18 @@ class ROITool:
             print(f"設定ファイルの読み込みエラー: {e}")
             return {}
     
-    def save_config(self):
-        """設定ファイルに保存"""
+    def snapshot_rois(self) -> Dict[int, List[int]]:
+        """現在のROI設定の比較用コピーを作成"""
+        return {lamp_id: list(roi) for lamp_id, roi in self.rois.items()}
+    
+    def save_config(self) -> bool:
+        """設定ファイルに保存（保存した場合はTrueを返す）"""
+        if self.snapshot_rois() == self._saved_rois:
+            print("ROI設定に変更がないため保存を省略しました")
+            return False
+        
+        # 一時ファイルに書き出してから置き換える（書き込み途中で中断しても設定ファイルが壊れない）
+        tmp_path = f"{self.config_path}.tmp"
         try:
             # ROI設定を更新
             if "rois" not in self.config:
@@ -85,14 +132,22 @@ class ROITool:
             for lamp_id, roi in self.rois.items():
                 self.config["rois"][f"lamp_{lamp_id}"] = roi
             
-            # ファイルに保存
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                yaml.dump(self.config, f, default_flow_style=False, allow_unicode=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                yaml.dump(self.config, f, Dumper=YAML_DUMPER, default_flow_style=False, allow_unicode=True)
+            os.replace(tmp_path, self.config_path)
             
+            self._saved_rois = self.snapshot_rois()
             print(f"設定を {self.config_path} に保存しました")
+            return True
             
         except Exception as e:
             print(f"設定ファイルの保存エラー: {e}")
+            # 書きかけの一時ファイルを残さない
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
     
     def initialize_camera(self) -> bool:
         """カメラを初期化"""
@@ -100,12 +155,26 @@ class ROITool:
             camera_config = self.config.get("camera", {})
             device_id = camera_config.get("device_id", 0)
             
-            self.cap = cv2.VideoCapture(device_id, cv2.CAP_DSHOW)
+            # 取得フォーマット（MJPGはUSB帯域に余裕ができ高解像度でもfpsが出やすい）。4文字でなければ指定しない
+            fourcc = camera_config.get("fourcc", "MJPG")
+            if fourcc and not (isinstance(fourcc, str) and len(fourcc) == 4):
+                print(f"camera.fourcc {fourcc!r} は4文字のコードではないため無視します")
+                fourcc = None
+            
+            self.cap = cv2.VideoCapture(device_id, CAPTURE_BACKEND)
+            
+            if not self.cap.isOpened():
+                self.cap.release()
+                self.cap = cv2.VideoCapture(device_id)
             
             if not self.cap.isOpened():
                 print(f"カメラ {device_id} を開けませんでした")
                 return False
             
+            # 取得フォーマットは解像度より先に指定する
+            if fourcc:
+                self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+            
             # カメラ設定
             if "size" in camera_config:
                 width, height = camera_config["size"]
@@ -116,15 +185,27 @@ class ROITool:
                 fps = camera_config["fps"]
                 self.cap.set(cv2.CAP_PROP_FPS, fps)
             
+            # ドライバ側のバッファを最小にし、ドラッグ中に古いフレームが表示されないようにする
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            
             # 実際の設定値を確認
             actual_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
             actual_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
             
+            # ドライバがフォーマット指定を無視した場合は知らせる（映像はそのまま使える）
+            if fourcc:
+                actual_code = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+                actual_fourcc = "".join(chr((actual_code >> (8 * i)) & 0xFF) for i in range(4))
+                if actual_fourcc != fourcc:
+                    print(f"フォーマット {fourcc} は使用されませんでした（実際: {actual_fourcc!r}）")
+            
             print(f"カメラを初期化しました: {actual_width}x{actual_height}")
             return True
             
         except Exception as e:
             print(f"カメラ初期化エラー: {e}")
+            # 開いた後の設定で失敗した場合もデバイスを解放する
+            self.release_camera()
             return False
     
     def release_camera(self):
@@ -133,6 +214,29 @@ class ROITool:
             self.cap.release()
             self.cap = None
     
+    def _put_latest_frame(self, frame: Optional[np.ndarray]):
+        """フレームキューに投入（満杯なら最も古いフレームを捨てて入れ替える）"""
+        try:
+            self._frame_q.put_nowait(frame)
+        except queue.Full:
+            try:
+                self._frame_q.get_nowait()
+            except queue.Empty:
+                pass
+            self._frame_q.put_nowait(frame)
+    
+    def _capture_loop(self):
+        """カメラからフレームを読み続けるキャプチャスレッド"""
+        while not self._stop_event.is_set():
+            ret, frame = self.cap.read()
+            
+            if not ret:
+                print("フレームの取得に失敗しました")
+                self._put_latest_frame(None)  # 終了をメインループへ通知
+                break
+            
+            self._put_latest_frame(frame)
+    
     def mouse_callback(self, event, x, y, flags, param):
         """マウスコールバック関数"""
         if event == cv2.EVENT_LBUTTONDOWN:
@@ -161,6 +265,7 @@ class ROITool:
                 
                 if roi_w > 10 and roi_h > 10:  # 最小サイズチェック
                     self.rois[self.current_lamp_id] = [roi_x, roi_y, roi_w, roi_h]
+                    self._roi_draw_cache = None
                     print(f"ランプ {self.current_lamp_id} のROIを設定: [{roi_x}, {roi_y}, {roi_w}, {roi_h}]")
                     
                     # 次のランプIDに進む
@@ -173,19 +278,54 @@ class ROITool:
             self.start_point = None
             self.end_point = None
     
+    def next_lamp(self):
+        """次のランプIDへ（1→12）"""
+        if self.current_lamp_id < 12:
+            self.current_lamp_id += 1
+            print(f"ランプID: {self.current_lamp_id}")
+    
+    def prev_lamp(self):
+        """前のランプIDへ（12→1）"""
+        if self.current_lamp_id > 1:
+            self.current_lamp_id -= 1
+            print(f"ランプID: {self.current_lamp_id}")
+    
+    def delete_current_roi(self):
+        """現在のランプIDのROIを削除"""
+        if self.current_lamp_id in self.rois:
+            del self.rois[self.current_lamp_id]
+            self._roi_draw_cache = None
+            print(f"ランプ {self.current_lamp_id} のROIを削除しました")
+    
+    def save_config_from_key(self):
+        """キー操作による設定保存"""
+        if self.save_config():
+            print("設定を保存しました")
+    
     def draw_overlay(self, frame: np.ndarray) -> np.ndarray:
-        """オーバーレイを描画"""
-        overlay_frame = frame.copy()
+        """オーバーレイを描画
+        
+        ドラッグ中は同じフレームに何度も描き直すため元フレームは書き換えず、使い回しのバッファに描画して返す
+        （戻り値は次の呼び出しで上書きされる）
+        """
+        if self._overlay_buf is None or self._overlay_buf.shape != frame.shape:
+            self._overlay_buf = np.empty_like(frame)
+        np.copyto(self._overlay_buf, frame)
+        overlay_frame = self._overlay_buf
         
         # 既存のROIを描画
-        for lamp_id, roi in self.rois.items():
-            x, y, w, h = roi
+        if self._roi_draw_cache is None:
+            self._roi_draw_cache = [
+                (lamp_id, (int(x), int(y)), (int(x + w), int(y + h)), f"L{lamp_id}", (int(x), int(y - 5)))
+                for lamp_id, (x, y, w, h) in self.rois.items()
+            ]
+        
+        for lamp_id, pt1, pt2, text, text_org in self._roi_draw_cache:
             color = (0, 255, 0) if lamp_id != self.current_lamp_id else (0, 255, 255)
-            cv2.rectangle(overlay_frame, (x, y), (x + w, y + h), color, 2)
+            cv2.rectangle(overlay_frame, pt1, pt2, color, 2)
             
             # ランプ番号を描画
-            text = f"L{lamp_id}"
-            cv2.putText(overlay_frame, text, (x, y - 5), 
+            cv2.putText(overlay_frame, text, text_org, 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
         
         # 現在描画中の矩形を描画
@@ -234,26 +374,35 @@ class ROITool:
         cv2.namedWindow("ROI Tool", cv2.WINDOW_AUTOSIZE)
         cv2.setMouseCallback("ROI Tool", self.mouse_callback)
         
+        # キャプチャは別スレッドで行い、カメラの待ち時間で画面更新・マウス操作が止まらないようにする
+        self._stop_event.clear()
+        self._capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._capture_thread.start()
+        
         try:
             while True:
-                ret, frame = self.cap.read()
-                
-                if not ret:
-                    print("フレームの取得に失敗しました")
-                    break
-                
-                self.current_frame = frame
-                
-                # オーバーレイを描画
-                display_frame = self.draw_overlay(frame)
-                
-                # フレーム表示
+                # 新しいフレームが届いていれば最新の1枚だけを使う
                 try:
-                    cv2.imshow("ROI Tool", display_frame)
-                except cv2.error:
-                    # ウィンドウが閉じられた場合
-                    print("ウィンドウが閉じられました")
-                    break
+                    frame = self._frame_q.get(timeout=0.015)
+                    if frame is None:
+                        break
+                    self.current_frame = frame
+                    redraw = True
+                except queue.Empty:
+                    # 届いていなくてもドラッグ中は矩形を追従させるため前のフレームで描き直す
+                    redraw = self.drawing and self.current_frame is not None
+                
+                if redraw:
+                    # オーバーレイを描画
+                    display_frame = self.draw_overlay(self.current_frame)
+                    
+                    # フレーム表示
+                    try:
+                        cv2.imshow("ROI Tool", display_frame)
+                    except cv2.error:
+                        # ウィンドウが閉じられた場合
+                        print("ウィンドウが閉じられました")
+                        break
                 
                 # キー入力処理
                 key = cv2.waitKey(1) & 0xFF
@@ -271,27 +420,26 @@ class ROITool:
                 
                 if key == ord('q') or key == 27:  # 'q'キーまたはESCキー
                     break
-                elif key == ord('n'):
-                    if self.current_lamp_id < 12:
-                        self.current_lamp_id += 1
-                        print(f"ランプID: {self.current_lamp_id}")
-                elif key == ord('p'):
-                    if self.current_lamp_id > 1:
-                        self.current_lamp_id -= 1
-                        print(f"ランプID: {self.current_lamp_id}")
-                elif key == ord('d'):
-                    if self.current_lamp_id in self.rois:
-                        del self.rois[self.current_lamp_id]
-                        print(f"ランプ {self.current_lamp_id} のROIを削除しました")
-                elif key == ord('s'):
-                    self.save_config()
-                    print("設定を保存しました")
+                
+                handler = self._key_handlers.get(key)
+                if handler is not None:
+                    handler()
                 
         except KeyboardInterrupt:
             print("\nキーボード割り込みで終了します")
         finally:
+            self._stop_event.set()
+            capture_running = False
+            if self._capture_thread is not None:
+                self._capture_thread.join(timeout=2.0)
+                # read() から戻らないスレッドがあるうちにカメラを解放すると競合するため、解放はプロセス終了に任せる
+                capture_running = self._capture_thread.is_alive()
+                self._capture_thread = None
             cv2.destroyAllWindows()
-            self.release_camera()
+            if capture_running:
+                print("キャプチャスレッドが終了しないため、カメラの解放を省略します")
+            else:
+                self.release_camera()
             print("ROI設定ツールを終了しました")
     
     def print_roi_summary(self):
@@ -10,7 +10,7 @@ PCモニター上に制御盤ランプを模した「仮想ダッシュボード
 ■ 概要
 - 12個のランプをグリッド配置で表示（初期状態は全て緑）
 - キーボード操作でランプの色を切替（緑 ↔ 赤）、点滅や一括変更も可能
-- 動的なウィンドウリサイズに対応し、スケーリングして表示を調整
+- 動的なウィンドウリサイズに対応し、スケーリングして表示を調整（synthetic.resizable: false で固定サイズ）
 - 画像保存機能あり（状態の記録やデバッグ用途）
 
 ■ 操作方法
@@ -34,34 +34,70 @@ import numpy as np
 import yaml
 import time
 import os
-from typing import Dict, List, Tuple
+from typing import Dict, List, Tuple, Optional
+
+from utils.yaml_cache import load_yaml_cached
+
+# ランプ状態の整数コード（描画・操作では整数で扱い、表示時のみ名前に変換）
+STATE_UNKNOWN, STATE_RED, STATE_GREEN = 0, 1, 2
+STATE_NAMES = ("UNKNOWN", "RED", "GREEN")
+# 状態ごとのランプの色 (BGR)
+STATE_COLORS = ((128, 128, 128), (0, 0, 255), (0, 255, 0))  # 灰色, 赤, 緑
 
 class SyntheticDashboard:
-    def __init__(self, config_path: str = "config.yaml"):
-        """初期化"""
+    def __init__(self, config_path: str = "config.yaml", resizable: Optional[bool] = None):
+        """初期化（resizable省略時は設定ファイルの synthetic.resizable に従う）"""
         self.config = self.load_config(config_path)
-        self.lamp_states = ["GREEN"] * 12  # 初期状態は全て緑
-        self.blink_states = [False] * 12   # 点滅状態
+        self.lamp_states = np.full(12, STATE_GREEN, dtype=np.uint8)  # 初期状態は全て緑
+        self.blink_states = np.zeros(12, dtype=bool)                # 点滅状態
         self.blink_timer = time.time()
         self.blink_on = True
+        self._dirty = True  # 表示内容が変わり、描き直しが必要か
         self.window_closed = False  # ウィンドウが閉じられたかのフラグ
+        self._rng = np.random.default_rng()  # ランダム赤用の乱数生成器
         
         # 設定値の取得
         self.default_window_size = self.config["synthetic"]["window_size"]
         self.current_window_size = self.default_window_size.copy()
         self.default_lamp_size = self.config["synthetic"]["lamp_size"]
-        self.bg_color = tuple(self.config["synthetic"]["background_color"])
-        self.text_color = tuple(self.config["synthetic"]["text_color"])
+        # 色はOpenCVの描画関数にそのまま渡せる整数タプルに、下地の塗りつぶし用にはuint8の画素値に一度だけ変換
+        self.bg_color = tuple(int(c) for c in self.config["synthetic"]["background_color"])
+        self.text_color = tuple(int(c) for c in self.config["synthetic"]["text_color"])
+        self._bg_pixel = np.array(self.bg_color, dtype=np.uint8)
+        
+        # キー入力と処理の対応表（1-0, -, = : ランプ1-12のトグル）
+        self._key_handlers = {
+            ord(key): (lambda lamp_id=lamp_id: self.toggle_lamp(lamp_id))
+            for lamp_id, key in enumerate("1234567890-=", start=1)
+        }
+        self._key_handlers.update({
+            ord('g'): lambda: self.set_all_lamps(STATE_GREEN),
+            ord('r'): lambda: self.set_all_lamps(STATE_RED),
+            ord('b'): self.toggle_blink,
+            ord('a'): self.random_red,
+            ord('s'): self.save_image,
+        })
         
-        # ウィンドウ作成（リサイズ可能に変更）
-        cv2.namedWindow("Synthetic Dashboard", cv2.WINDOW_NORMAL)
-        cv2.resizeWindow("Synthetic Dashboard", self.default_window_size[0], self.default_window_size[1])
+        # 描画位置・サイズ（ウィンドウサイズが変わったときだけ再計算）
+        self._geom_size = None
+        self.update_geometry()
+        
+        # ウィンドウのリサイズに追従するか（しない場合は既定サイズで固定し、ウィンドウサイズの確認も行わない）
+        if resizable is None:
+            resizable = self.config["synthetic"].get("resizable", True)
+        self.resizable = bool(resizable)
+        
+        # ウィンドウ作成
+        if self.resizable:
+            cv2.namedWindow("Synthetic Dashboard", cv2.WINDOW_NORMAL)
+            cv2.resizeWindow("Synthetic Dashboard", self.default_window_size[0], self.default_window_size[1])
+        else:
+            cv2.namedWindow("Synthetic Dashboard", cv2.WINDOW_AUTOSIZE)
         
     def load_config(self, config_path: str) -> Dict:
         """設定ファイルを読み込み"""
         try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f)
+            return load_yaml_cached(config_path)
         except FileNotFoundError:
             print(f"設定ファイル {config_path} が見つかりません")
             raise
@@ -79,9 +115,14 @@ class SyntheticDashboard:
         except:
             # 取得できない場合はデフォルトサイズを使用
             self.current_window_size = self.default_window_size.copy()
+        
+        if tuple(self.current_window_size) != self._geom_size:
+            self.update_geometry()
     
-    def get_dynamic_sizes(self):
-        """現在のウィンドウサイズに基づいて動的サイズを計算"""
+    def update_geometry(self):
+        """現在のウィンドウサイズに基づいてランプ位置・サイズ・文字サイズをまとめて計算"""
+        self._geom_size = tuple(self.current_window_size)
+        
         # スケール比を計算
         scale_x = self.current_window_size[0] / self.default_window_size[0]
         scale_y = self.current_window_size[1] / self.default_window_size[1]
@@ -97,65 +138,90 @@ class SyntheticDashboard:
         spacing_x = int(100 * scale_x)
         spacing_y = int(70 * scale_y)
         
-        return (lamp_w, lamp_h), margin_x, margin_y, spacing_x, spacing_y
-    
-    def get_lamp_position(self, lamp_id: int) -> Tuple[int, int]:
-        """ランプIDから表示位置を計算（動的サイズ対応）"""
-        # 4x3のグリッドレイアウト
-        col = (lamp_id - 1) % 4
-        row = (lamp_id - 1) // 4
+        self._dynamic_sizes = ((lamp_w, lamp_h), margin_x, margin_y, spacing_x, spacing_y)
+        
+        # ランプごとの表示位置（4x3のグリッドレイアウト、インデックス = lamp_id - 1）
+        self._lamp_positions = [
+            (margin_x + (i % 4) * spacing_x, margin_y + (i // 4) * spacing_y)
+            for i in range(12)
+        ]
         
-        # 動的サイズを取得
-        _, margin_x, margin_y, spacing_x, spacing_y = self.get_dynamic_sizes()
+        # ランプ番号の文字サイズと、ランプ中央に置くための描画位置
+        self._label_font_scale = scale * 0.7
+        self._label_thickness = max(1, int(scale * 2))
+        self._label_origins = []
+        for lamp_id, (x, y) in enumerate(self._lamp_positions, start=1):
+            text_size = cv2.getTextSize(str(lamp_id), cv2.FONT_HERSHEY_SIMPLEX, self._label_font_scale, self._label_thickness)[0]
+            self._label_origins.append((x + (lamp_w - text_size[0]) // 2, y + (lamp_h + text_size[1]) // 2))
         
-        x = margin_x + col * spacing_x
-        y = margin_y + row * spacing_y
+        # 操作説明の文字サイズと配置
+        self._info_font_scale = scale * 0.4
+        self._info_y_offset = self.current_window_size[1] - int(55 * scale_y)
+        self._info_line_height = int(15 * scale_y)
+        self._info_margin_x = int(10 * scale_x)
         
-        return x, y
+        # ランプ内部の塗りつぶし範囲（線幅2の白枠に隠れる外周2画素を除く。枠だけで埋まる場合はNone）
+        self._lamp_interiors = [
+            ((x + 2, y + 2), (x + lamp_w - 2, y + lamp_h - 2)) if lamp_w >= 4 and lamp_h >= 4 else None
+            for x, y in self._lamp_positions
+        ]
+        
+        self.render_background()
+        self._dirty = True
     
-    def draw_lamp(self, frame: np.ndarray, lamp_id: int, state: str, is_blinking: bool = False):
-        """ランプを描画"""
-        x, y = self.get_lamp_position(lamp_id)
-        lamp_size, _, _, _, _ = self.get_dynamic_sizes()
-        w, h = lamp_size
+    def render_background(self):
+        """背景・操作説明・ランプの白枠といった毎フレーム変わらない部分を描いた下地を作成"""
+        background = np.empty((self.current_window_size[1], self.current_window_size[0], 3), dtype=np.uint8)
+        background[:] = self._bg_pixel
         
+        # ランプの枠（フィナンシェ形状を矩形で近似）
+        w, h = self._dynamic_sizes[0]
+        for x, y in self._lamp_positions:
+            cv2.rectangle(background, (x, y), (x + w, y + h), (255, 255, 255), 2)
+        
+        # 操作説明を描画（動的サイズ対応）
+        instructions = [
+            "Controls:",
+            "1-0: Toggle L1-L10 , -: Toggle L11, =: Toggle L12",
+            "g: All Green, r: All Red, b: Blink, a: Random Red",
+            "s: Save Image, q: Quit"
+        ]
+        
+        for i, instruction in enumerate(instructions):
+            cv2.putText(background, instruction, (self._info_margin_x, self._info_y_offset + i * self._info_line_height), 
+                       cv2.FONT_HERSHEY_SIMPLEX, self._info_font_scale, self.text_color, 1)
+        
+        self._background = background
+    
+    def get_dynamic_sizes(self):
+        """現在のウィンドウサイズに基づいた動的サイズを返す"""
+        return self._dynamic_sizes
+    
+    def get_lamp_position(self, lamp_id: int) -> Tuple[int, int]:
+        """ランプIDから表示位置を返す（動的サイズ対応）"""
+        return self._lamp_positions[lamp_id - 1]
+    
+    def draw_lamp(self, frame: np.ndarray, lamp_id: int, state: int, is_blinking: bool = False):
+        """ランプを描画（白枠は下地に描画済みのため、内部の色とランプ番号のみ）"""
         # 点滅処理
         if is_blinking and not self.blink_on:
             color = self.bg_color
         else:
-            if state == "RED":
-                color = (0, 0, 255)  # BGR: 赤
-            elif state == "GREEN":
-                color = (0, 255, 0)  # BGR: 緑
-            else:  # UNKNOWN
-                color = (128, 128, 128)  # BGR: 灰色
+            color = STATE_COLORS[state]
         
-        # ランプ本体を描画（フィナンシェ形状を矩形で近似）
-        cv2.rectangle(frame, (x, y), (x + w, y + h), color, -1)
-        cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 255, 255), 2)
-        
-        # ランプ番号を描画（動的フォントサイズ）
-        scale_x = self.current_window_size[0] / self.default_window_size[0]
-        scale_y = self.current_window_size[1] / self.default_window_size[1]
-        font_scale = min(scale_x, scale_y) * 0.7
-        thickness = max(1, int(min(scale_x, scale_y) * 2))
+        # ランプ本体を描画（枠の内側だけを塗る）
+        interior = self._lamp_interiors[lamp_id - 1]
+        if interior is not None:
+            cv2.rectangle(frame, interior[0], interior[1], color, -1)
         
-        text = str(lamp_id)
-        text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)[0]
-        text_x = x + (w - text_size[0]) // 2
-        text_y = y + (h + text_size[1]) // 2
-        cv2.putText(frame, text, (text_x, text_y), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 0), thickness)
+        # ランプ番号を描画（動的フォントサイズ、位置は計算済み）
+        cv2.putText(frame, str(lamp_id), self._label_origins[lamp_id - 1], cv2.FONT_HERSHEY_SIMPLEX, 
+                   self._label_font_scale, (0, 0, 0), self._label_thickness)
     
     def create_frame(self) -> np.ndarray:
         """フレームを生成（動的サイズ対応）"""
-        # 現在のウィンドウサイズでフレームを作成
-        frame = np.full((self.current_window_size[1], self.current_window_size[0], 3), self.bg_color, dtype=np.uint8)
-        
-        # 点滅タイマー更新
-        current_time = time.time()
-        if current_time - self.blink_timer > 0.5:  # 0.5秒間隔で点滅
-            self.blink_on = not self.blink_on
-            self.blink_timer = current_time
+        # 描画済みの下地をコピーしてフレームを作成
+        frame = self._background.copy()
         
         # 各ランプを描画
         for i in range(12):
@@ -164,72 +230,62 @@ class SyntheticDashboard:
             is_blinking = self.blink_states[i]
             self.draw_lamp(frame, lamp_id, state, is_blinking)
         
-        # 動的スケールを取得
-        scale_x = self.current_window_size[0] / self.default_window_size[0]
-        scale_y = self.current_window_size[1] / self.default_window_size[1]
-        font_scale = min(scale_x, scale_y) * 0.4
-        
-        # 操作説明を描画（動的サイズ対応）
-        instructions = [
-            "Controls:",
-            "1-0: Toggle L1-L10 , -: Toggle L11, =: Toggle L12",
-            "g: All Green, r: All Red, b: Blink, a: Random Red",
-            "s: Save Image, q: Quit"
-        ]
-        
-        y_offset = self.current_window_size[1] - int(55 * scale_y)
-        line_height = int(15 * scale_y)
-        margin_x = int(10 * scale_x)
-        
-        for i, instruction in enumerate(instructions):
-            cv2.putText(frame, instruction, (margin_x, y_offset + i * line_height), 
-                       cv2.FONT_HERSHEY_SIMPLEX, font_scale, self.text_color, 1)
-        
         return frame
     
+    def update_blink(self):
+        """点滅タイマーを更新し、点滅中のランプがあれば描き直しを要求"""
+        current_time = time.time()
+        if current_time - self.blink_timer > 0.5:  # 0.5秒間隔で点滅
+            self.blink_on = not self.blink_on
+            self.blink_timer = current_time
+            if self.blink_states.any():
+                self._dirty = True
+    
     def toggle_lamp(self, lamp_id: int):
         """ランプの状態をトグル"""
         if 1 <= lamp_id <= 12:
             idx = lamp_id - 1
-            if self.lamp_states[idx] == "GREEN":
-                self.lamp_states[idx] = "RED"
+            if self.lamp_states[idx] == STATE_GREEN:
+                self.lamp_states[idx] = STATE_RED
             else:
-                self.lamp_states[idx] = "GREEN"
-            print(f"ランプ {lamp_id}: {self.lamp_states[idx]}")
+                self.lamp_states[idx] = STATE_GREEN
+            print(f"ランプ {lamp_id}: {STATE_NAMES[self.lamp_states[idx]]}")
+            self._dirty = True
     
-    def set_all_lamps(self, state: str):
+    def set_all_lamps(self, state: int):
         """全ランプの状態を設定"""
-        self.lamp_states = [state] * 12
-        self.blink_states = [False] * 12
-        print(f"全ランプ: {state}")
+        self.lamp_states.fill(state)
+        self.blink_states.fill(False)
+        print(f"全ランプ: {STATE_NAMES[state]}")
+        self._dirty = True
     
     def toggle_blink(self):
         """一部のランプの点滅をトグル"""
         # ランプ2, 5, 8を点滅対象とする
         blink_targets = [1, 4, 7]  # 0-based index
-        for idx in blink_targets:
-            self.blink_states[idx] = not self.blink_states[idx]
+        self.blink_states[blink_targets] = ~self.blink_states[blink_targets]
         print("点滅状態をトグルしました")
+        self._dirty = True
     
     def random_red(self):
         """ランダムに一部のランプを赤にする"""
-        import random
-        num_red = random.randint(1, 4)
-        red_indices = random.sample(range(12), num_red)
+        num_red = int(self._rng.integers(1, 5))
+        red_indices = self._rng.choice(12, size=num_red, replace=False)
         
-        self.lamp_states = ["GREEN"] * 12
-        for idx in red_indices:
-            self.lamp_states[idx] = "RED"
+        self.lamp_states.fill(STATE_GREEN)
+        self.lamp_states[red_indices] = STATE_RED
         
-        lamp_numbers = [idx + 1 for idx in red_indices]
+        lamp_numbers = (red_indices + 1).tolist()
         print(f"ランダム赤: ランプ {lamp_numbers}")
+        self._dirty = True
     
     def save_image(self):
         """現在の画像を保存"""
         frame = self.create_frame()
         timestamp = time.strftime("%Y%m%d_%H%M%S")
         filename = f"dashboard_{timestamp}.png"
-        cv2.imwrite(filename, frame)
+        # 確認用のスクリーンショットなので圧縮は最小限にして保存を速くする（PNGなので画質は劣化しない）
+        cv2.imwrite(filename, frame, [cv2.IMWRITE_PNG_COMPRESSION, 1])
         print(f"画像を保存しました: {filename}")
     
     def run(self):
@@ -243,25 +299,33 @@ class SyntheticDashboard:
         print("  s: 画像保存, q: 終了")
         print("  ×ボタン: ウィンドウを閉じて終了")
         
+        loop_count = 0
+        
         try:
             while True:
-                # ウィンドウサイズを更新
-                self.update_window_size()
-                
-                # フレーム生成と表示
-                frame = self.create_frame()
+                # ウィンドウサイズを更新（リサイズ操作は連続して起きるため15回に1回確認すれば十分）
+                if self.resizable and loop_count % 15 == 0:
+                    self.update_window_size()
+                loop_count += 1
                 
-                try:
-                    cv2.imshow("Synthetic Dashboard", frame)
-                except cv2.error:
-                    # ウィンドウが閉じられた場合
-                    print("ウィンドウが閉じられました")
-                    break
+                # 点滅の切り替わり・リサイズ・キー操作で表示が変わったときだけフレームを生成して表示
+                self.update_blink()
+                if self._dirty:
+                    frame = self.create_frame()
+                    
+                    try:
+                        cv2.imshow("Synthetic Dashboard", frame)
+                    except cv2.error:
+                        # ウィンドウが閉じられた場合
+                        print("ウィンドウが閉じられました")
+                        break
+                    self._dirty = False
                 
                 # キー入力処理
                 key = cv2.waitKey(30) & 0xFF
                 
                 # ウィンドウの状態をチェック（×ボタン対応）
+                # 間引くと、閉じられた直後の imshow でウィンドウが作り直されて閉じる操作が無視されるため毎回確認する
                 try:
                     # ウィンドウプロパティを取得してウィンドウの存在を確認
                     if cv2.getWindowProperty("Synthetic Dashboard", cv2.WND_PROP_VISIBLE) < 1:
@@ -274,40 +338,10 @@ class SyntheticDashboard:
                 
                 if key == ord('q') or key == 27:  # 'q'キーまたはESCキー
                     break
-                elif key == ord('1'):
-                    self.toggle_lamp(1)
-                elif key == ord('2'):
-                    self.toggle_lamp(2)
-                elif key == ord('3'):
-                    self.toggle_lamp(3)
-                elif key == ord('4'):
-                    self.toggle_lamp(4)
-                elif key == ord('5'):
-                    self.toggle_lamp(5)
-                elif key == ord('6'):
-                    self.toggle_lamp(6)
-                elif key == ord('7'):
-                    self.toggle_lamp(7)
-                elif key == ord('8'):
-                    self.toggle_lamp(8)
-                elif key == ord('9'):
-                    self.toggle_lamp(9)
-                elif key == ord('0'):
-                    self.toggle_lamp(10)
-                elif key == ord('-'):
-                    self.toggle_lamp(11)
-                elif key == ord('='):
-                    self.toggle_lamp(12)
-                elif key == ord('g'):
-                    self.set_all_lamps("GREEN")
-                elif key == ord('r'):
-                    self.set_all_lamps("RED")
-                elif key == ord('b'):
-                    self.toggle_blink()
-                elif key == ord('a'):
-                    self.random_red()
-                elif key == ord('s'):
-                    self.save_image()
+                
+                handler = self._key_handlers.get(key)
+                if handler is not None:
+                    handler()
                 
         except KeyboardInterrupt:
             print("\nキーボード割り込みで終了します")
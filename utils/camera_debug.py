@@ -4,8 +4,19 @@
 """
 
 import cv2
+import os
 import sys
 import subprocess
+from typing import List, Optional, Tuple
+
+# CAMERA_DEBUG_HEADLESS=0 のときだけ成功フレームをウィンドウ表示する
+HEADLESS = os.environ.get("CAMERA_DEBUG_HEADLESS", "1") == "1"
+
+# CAP_ANY が最初に試すカメラバックエンド（取得できない古いビルドでは None）
+try:
+    DEFAULT_CAMERA_BACKEND = cv2.videoio_registry.getCameraBackends()[0]
+except (AttributeError, IndexError, cv2.error):
+    DEFAULT_CAMERA_BACKEND = None
 
 def check_privacy_settings():
     """Windowsのプライバシー設定を確認"""
@@ -17,59 +28,115 @@ def check_privacy_settings():
     print("4. Python.exe がカメラアクセス許可リストにあるか")
     print()
 
+# 表示用のバックエンド名
+BACKEND_LABELS = {
+    cv2.CAP_DSHOW: "CAP_DSHOW",
+    cv2.CAP_MSMF: "CAP_MSMF",
+    cv2.CAP_V4L2: "CAP_V4L2",
+    cv2.CAP_AVFOUNDATION: "CAP_AVFOUNDATION",
+}
+
+# LAMP_CAMERA_BACKEND で指定できるバックエンド
+# 使用するカメラが決まっている環境では LAMP_CAMERA_DEVICE（番号またはデバイス名）と
+# LAMP_CAMERA_BACKEND を設定すると、総当たりの前にそのカメラだけを試す
+HINT_BACKENDS = {
+    "dshow": cv2.CAP_DSHOW,
+    "msmf": cv2.CAP_MSMF,
+    "v4l2": cv2.CAP_V4L2,
+    "avfoundation": cv2.CAP_AVFOUNDATION,
+}
+
+def _try_open(source, backend=None, indent: str = "  ", show_title: Optional[str] = None) -> Tuple[bool, bool]:
+    """カメラを開いて1フレーム読み取り、結果を表示する
+    
+    Returns:
+        (オープン成功, フレーム読み取り成功)
+    """
+    opened = False
+    ret = False
+    cap = None
+    try:
+        if backend is None:
+            cap = cv2.VideoCapture(source)
+            args = repr(source)
+        else:
+            cap = cv2.VideoCapture(source, backend)
+            args = f"{source!r}, {BACKEND_LABELS.get(backend, backend)}"
+        opened = cap.isOpened()
+        print(f"  VideoCapture({args}): {opened}")
+        if opened:
+            ret, frame = cap.read()
+            print(f"{indent}フレーム読み取り: {ret}")
+            if ret:
+                print(f"{indent}フレームサイズ: {frame.shape}")
+                if show_title is not None:
+                    # 簡単なテスト表示
+                    _show_test_frame(show_title, frame)
+    except Exception as e:
+        print(f"{indent}エラー: {e}")
+    finally:
+        # 例外時もデバイスを確実に解放する
+        if cap is not None:
+            cap.release()
+    return opened, ret
+
+def _show_test_frame(title: str, frame):
+    """成功したフレームを表示して確認（ヘッドレス時は何もしない）"""
+    if not HEADLESS:
+        cv2.imshow(title, frame)
+        cv2.waitKey(1000)  # 1秒表示
+        cv2.destroyAllWindows()
+
+def _list_dshow_devices() -> Optional[List[str]]:
+    """DirectShowのカメラ名一覧を取得（Windows以外・pygrabber未導入の環境では None）"""
+    if sys.platform != "win32":
+        return None
+    try:
+        from pygrabber.dshow_graph import FilterGraph
+    except ImportError:
+        return None
+    try:
+        return FilterGraph().get_input_devices()
+    except Exception as e:
+        print(f"  カメラ一覧の取得エラー: {e}")
+        return None
+
 def test_camera_with_different_methods():
     """異なる方法でカメラテスト"""
     print("=== 詳細カメラテスト ===")
     
+    # 方法0: 環境変数で指定されたカメラ
+    hint = os.environ.get("LAMP_CAMERA_DEVICE")
+    if hint:
+        print("方法0: 環境変数 LAMP_CAMERA_DEVICE / LAMP_CAMERA_BACKEND の指定")
+        device = int(hint) if hint.isdigit() else hint
+        backend_name = os.environ.get("LAMP_CAMERA_BACKEND", "").lower()
+        backend = HINT_BACKENDS.get(backend_name)
+        if backend_name and backend is None:
+            print(f"  未対応のバックエンド指定 '{backend_name}' は無視します（{', '.join(HINT_BACKENDS)}）")
+        _, ret = _try_open(device, backend, "    ", f"Test {device}")
+        if ret:
+            return device
+        print()
+    
     # 方法1: デフォルト
     print("方法1: デフォルトバックエンド")
-    try:
-        cap = cv2.VideoCapture(0)
-        print(f"  VideoCapture(0): {cap.isOpened()}")
-        if cap.isOpened():
-            ret, frame = cap.read()
-            print(f"  フレーム読み取り: {ret}")
-            if ret:
-                print(f"  フレームサイズ: {frame.shape}")
-        cap.release()
-    except Exception as e:
-        print(f"  エラー: {e}")
+    _try_open(0)
     
     # 方法2: DSHOW with different indices
     print("\n方法2: DSHOWバックエンド（複数インデックス）")
     for i in range(3):
-        try:
-            cap = cv2.VideoCapture(i, cv2.CAP_DSHOW)
-            is_opened = cap.isOpened()
-            print(f"  VideoCapture({i}, CAP_DSHOW): {is_opened}")
-            if is_opened:
-                ret, frame = cap.read()
-                print(f"    フレーム読み取り: {ret}")
-                if ret:
-                    print(f"    フレームサイズ: {frame.shape}")
-                    # 簡単なテスト表示
-                    cv2.imshow(f"Test Camera {i}", frame)
-                    cv2.waitKey(1000)  # 1秒表示
-                    cv2.destroyAllWindows()
-                    cap.release()
-                    return i  # 成功したインデックスを返す
-            cap.release()
-        except Exception as e:
-            print(f"    エラー: {e}")
+        _, ret = _try_open(i, cv2.CAP_DSHOW, "    ", f"Test Camera {i}")
+        if ret:
+            return i  # 成功したインデックスを返す
     
     # 方法3: MSMF
     print("\n方法3: MSMFバックエンド")
-    try:
-        cap = cv2.VideoCapture(0, cv2.CAP_MSMF)
-        print(f"  VideoCapture(0, CAP_MSMF): {cap.isOpened()}")
-        if cap.isOpened():
-            ret, frame = cap.read()
-            print(f"  フレーム読み取り: {ret}")
-            if ret:
-                print(f"  フレームサイズ: {frame.shape}")
-        cap.release()
-    except Exception as e:
-        print(f"  エラー: {e}")
+    if DEFAULT_CAMERA_BACKEND == cv2.CAP_MSMF:
+        # デフォルトバックエンドがMSMFなら方法1と同じ経路なので開き直さない
+        print("  デフォルトバックエンドがMSMFのため方法1の結果と同じです（スキップ）")
+    else:
+        _try_open(0, cv2.CAP_MSMF)
     
     # 方法4: デバイス名
     print("\n方法4: デバイス名指定")
@@ -80,24 +147,19 @@ def test_camera_with_different_methods():
         "USB Camera"
     ]
     
+    # カメラ一覧が取れる場合は候補名を含む実在デバイスだけを試す
+    devices = _list_dshow_devices()
+    if devices is not None:
+        print(f"  検出したカメラ: {devices}")
+        targets = [name.lower() for name in device_names]
+        device_names = [d for d in devices if any(t in d.lower() for t in targets)]
+        if not device_names:
+            print("  候補名に一致するカメラはありません")
+    
     for device_name in device_names:
-        try:
-            cap = cv2.VideoCapture(device_name, cv2.CAP_DSHOW)
-            is_opened = cap.isOpened()
-            print(f"  VideoCapture('{device_name}', CAP_DSHOW): {is_opened}")
-            if is_opened:
-                ret, frame = cap.read()
-                print(f"    フレーム読み取り: {ret}")
-                if ret:
-                    print(f"    フレームサイズ: {frame.shape}")
-                    cv2.imshow(f"Test {device_name}", frame)
-                    cv2.waitKey(1000)
-                    cv2.destroyAllWindows()
-                cap.release()
-                return device_name
-            cap.release()
-        except Exception as e:
-            print(f"    エラー: {e}")
+        opened, _ = _try_open(device_name, cv2.CAP_DSHOW, "    ", f"Test {device_name}")
+        if opened:
+            return device_name
     
     return None
 
@@ -105,8 +167,17 @@ def check_opencv_info():
     """OpenCV情報を確認"""
     print("=== OpenCV情報 ===")
     print(f"OpenCVバージョン: {cv2.__version__}")
-    print(f"ビルド情報:")
-    print(cv2.getBuildInformation())
+    try:
+        backends = cv2.videoio_registry.getCameraBackends()
+        names = [cv2.videoio_registry.getBackendName(be) for be in backends]
+        print(f"カメラバックエンド: {', '.join(names)}")
+    except (AttributeError, cv2.error) as e:
+        print(f"カメラバックエンド: 取得できません ({e})")
+    
+    # 全ビルド情報は長いので LAMP_DEBUG_BUILD_INFO=1 のときだけ表示
+    if os.environ.get("LAMP_DEBUG_BUILD_INFO") == "1":
+        print(f"ビルド情報:")
+        print(cv2.getBuildInformation())
 
 def main():
     print("ウェブカメラデバッグツール")
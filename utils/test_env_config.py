@@ -9,13 +9,23 @@ import os
 import re
 from typing import Dict
 
+# YAMLの読み込みにはlibyamlのCローダーを優先して使う（未ビルド環境では純Python版）
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# スクリプトの親ディレクトリ（プロジェクトルート）
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+_PROJECT_ROOT = os.path.dirname(_SCRIPT_DIR)
+_DEFAULT_ENV_PATH = os.path.join(_PROJECT_ROOT, ".env")
+_CONFIG_PATH = os.path.join(_PROJECT_ROOT, 'config.yaml')
+
+# ${VAR_NAME} 形式の環境変数参照
+_ENV_VAR_RE = re.compile(r'\$\{([^}]+)\}')
+
 def load_env_file(env_path: str = None):
     """.envファイルを読み込んで環境変数に設定"""
     if env_path is None:
         # スクリプトの親ディレクトリ（プロジェクトルート）の.envファイルを探す
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.dirname(script_dir)
-        env_path = os.path.join(project_root, ".env")
+        env_path = _DEFAULT_ENV_PATH
     
     if not os.path.exists(env_path):
         print(f".envファイル ({env_path}) が見つかりません。")
@@ -55,17 +65,19 @@ def load_env_file(env_path: str = None):
 
 def expand_environment_variables(config: Dict) -> Dict:
     """設定内の環境変数を展開"""
+    def replace_env_var(match):
+        var_name = match.group(1)
+        env_value = os.getenv(var_name)
+        if env_value is None:
+            raise ValueError(f"環境変数 '{var_name}' が設定されていません")
+        return env_value
+    
     def expand_value(value):
         if isinstance(value, str):
-            # ${VAR_NAME} 形式の環境変数を展開
-            def replace_env_var(match):
-                var_name = match.group(1)
-                env_value = os.getenv(var_name)
-                if env_value is None:
-                    raise ValueError(f"環境変数 '{var_name}' が設定されていません")
-                return env_value
-            
-            return re.sub(r'\$\{([^}]+)\}', replace_env_var, value)
+            # ${VAR_NAME} 形式の環境変数を展開（'$' を含まない文字列はそのまま）
+            if '$' not in value:
+                return value
+            return _ENV_VAR_RE.sub(replace_env_var, value)
         elif isinstance(value, dict):
             return {k: expand_value(v) for k, v in value.items()}
         elif isinstance(value, list):
@@ -90,13 +102,11 @@ def test_config_loading():
         
         # config.yamlを読み込み
         print("3. config.yamlを読み込み中...")
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.dirname(script_dir)
-        config_path = os.path.join(project_root, 'config.yaml')
+        config_path = _CONFIG_PATH
         
         print(f"   config.yamlのパス: {config_path}")
         with open(config_path, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
+            config = yaml.load(f, Loader=YAML_LOADER)
         
         print(f"4. 展開前のsecret: {config['notify']['secret']}")
         
@@ -0,0 +1,38 @@
+"""
+yaml_cache.py
+設定ファイル（YAML）の読み込みキャッシュ（monitor_test.py / sim_dashboard.py / roi_tool.py 共通）
+"""
+
+import yaml
+import os
+import copy
+from collections import OrderedDict
+from typing import Dict
+
+# YAMLの読み込みにはlibyamlのCローダーを優先して使う（未ビルド環境では純Python版）
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# 設定ファイルのパース結果キャッシュ（絶対パス → (mtime, サイズ, 設定辞書)、LRU）
+_YAML_CACHE = OrderedDict()
+_YAML_CACHE_MAX_ENTRIES = 100
+
+def load_yaml_cached(path: str) -> Dict:
+    """YAMLファイルを読み込み（更新時刻とサイズが変わっていなければキャッシュを返す）"""
+    abs_path = os.path.abspath(path)
+    stat = os.stat(abs_path)
+    
+    cached = _YAML_CACHE.get(abs_path)
+    if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        _YAML_CACHE.move_to_end(abs_path)
+        return copy.deepcopy(cached[2])
+    
+    with open(abs_path, 'r', encoding='utf-8') as f:
+        data = yaml.load(f, Loader=YAML_LOADER)
+    
+    _YAML_CACHE[abs_path] = (stat.st_mtime_ns, stat.st_size, data)
+    _YAML_CACHE.move_to_end(abs_path)
+    while len(_YAML_CACHE) > _YAML_CACHE_MAX_ENTRIES:
+        _YAML_CACHE.popitem(last=False)
+    
+    # 呼び出し側で変更されてもキャッシュが汚れないようコピーを返す
+    return copy.deepcopy(data)